@@ -1,12 +1,12 @@
 import os
-import json
+import uuid
 import shutil # Import shutil for file operations
 from typing import Dict, Any
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, UploadFile, File # Import UploadFile and File
 from fastapi.middleware.cors import CORSMiddleware
 # from .services.rag_builder import analyze_document_logic, chat_with_documents_logic, load_analysis_cache, save_analysis_cache
-from .services.ingestion import process_pdfs_incrementally, load_metadata_db, save_metadata_db
+from .services.ingestion import vacuum_vector_store, rescore_heatmaps, cached_metadata_db, read_document_text, IngestionBusyError
 from fastapi.responses import FileResponse
 # --- Import new models ---
 # from .api.models import (
@@ -21,35 +21,48 @@ from .api.models import (
 )
 from .services.rag_builder import (
     analyze_document_logic, chat_with_documents_logic,
-    load_analysis_cache, save_analysis_cache
+    load_cached_analysis, save_cached_analysis, ANALYSIS_CACHE_WRITER, EMBEDDINGS
 )
 
 from .services.dashboard_service import generate_dashboard_logic
+from .services.vector_store import vector_store_holder
+from .services.document_db import get_document_db, METADATA_TABLE, ANALYSIS_CACHE_TABLE, DASHBOARD_TABLE, DASHBOARD_KEY
+from .services.ingestion_jobs import ingestion_queue
 from .services.ConnectionManager import manager
 # from .api.models import AnalyzeRequest, DocumentListResponse, ChatRequest, NotifyRequest, AnalysisResultModel 
 from fastapi import WebSocket, WebSocketDisconnect
-import fitz
-from openai import OpenAI
+from functools import lru_cache
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("--- Application starting up ---")
-    vector_store_path = "./data/vector_store/index.faiss"
-    if not os.path.exists(vector_store_path):
+    # Open documents.db now, so a one-time migration of the JSON files happens before the first request
+    get_document_db()
+    # Load the FAISS store once; every request then shares the resident copy
+    if vector_store_holder.load(EMBEDDINGS) is None:
         print("\nWARNING: Vector store 'index.faiss' not found.")
     else:
-        print("Vector store found. Application is ready.")
+        print("Vector store loaded. Application is ready.")
+    ingestion_queue.start()
+    ANALYSIS_CACHE_WRITER.start()
     yield
     print("--- Application shutting down ---")
+    ingestion_queue.stop()
+    # Writes out analyses saved since the last flush
+    ANALYSIS_CACHE_WRITER.stop()
 
 ### Podcast
-try:
-    if not os.getenv("OPENAI_API_KEY"):
-        raise ValueError("OPENAI_API_KEY environment variable not set.")
-    client = OpenAI()
-except ValueError as e:
-    print(f"FATAL: Could not initialize OpenAI client. Error: {e}")
-    client = None
+@lru_cache(maxsize=None)
+def get_openai_client():
+    """The OpenAI client for podcasts, created (and the SDK imported) on first use. None if not configured."""
+    try:
+        if not os.getenv("OPENAI_API_KEY"):
+            raise ValueError("OPENAI_API_KEY environment variable not set.")
+        from openai import OpenAI
+        return OpenAI()
+    except ValueError as e:
+        print(f"FATAL: Could not initialize OpenAI client. Error: {e}")
+        return None
 
 
 app = FastAPI(
@@ -66,40 +79,32 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-DASHBOARD_DATA_FILE = "dashboard_data.json"
 DOCUMENTS_DIR = "./data/pdfs_to_process"
 AUDIO_DIR = "./data/generated_audio"
+# Source text sent to the podcast script model (limits token usage)
+PODCAST_SOURCE_CHARS = 12000
 os.makedirs(AUDIO_DIR, exist_ok=True)
 
 
 @app.post("/api/save_dashboard")
 async def save_dashboard(data: DashboardData):
-    """Saves the dashboard data to a local JSON file."""
+    """Saves the dashboard data to the document store."""
     try:
-        dashboard_upload_dir = "./data/vector_store"
-        os.makedirs(dashboard_upload_dir, exist_ok=True)
-        dashboard_file_path = os.path.join(dashboard_upload_dir, DASHBOARD_DATA_FILE)        
-        with open(dashboard_file_path, "w") as f:
-            # Use .model_dump_json() for Pydantic v2+ or .json() for v1
-            f.write(data.model_dump_json(indent=4))
+        get_document_db().put(DASHBOARD_TABLE, DASHBOARD_KEY, data.model_dump(mode="json"))
         return {"message": "Dashboard data saved successfully."}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/load_dashboard")
 async def load_dashboard():
-    """Loads the dashboard data from the local JSON file if it exists."""
-    dashboard_upload_dir = "./data/vector_store"
-    os.makedirs(dashboard_upload_dir, exist_ok=True)
-    dashboard_file_path = os.path.join(dashboard_upload_dir, DASHBOARD_DATA_FILE) 
-    if not os.path.exists(dashboard_file_path):
-        raise HTTPException(status_code=404, detail="Dashboard data file not found.")
+    """Loads the saved dashboard data if there is one."""
     try:
-        with open(dashboard_file_path, "r") as f:
-            data = json.load(f)
-        return data
+        data = get_document_db().cached(DASHBOARD_TABLE).get(DASHBOARD_KEY)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    if data is None:
+        raise HTTPException(status_code=404, detail="Dashboard data file not found.")
+    return data
 
 
 @app.get("/api/dashboard", summary="Get Dashboard Overview")
@@ -119,7 +124,7 @@ def get_dashboard_data(start_date: str | None = None, end_date: str | None = Non
 
 # --- ADD THE NEW UPLOAD ENDPOINT ---
 @app.post("/api/upload", summary="Upload a PDF Document")
-async def upload_document(file: UploadFile = File(...)):
+def upload_document(file: UploadFile = File(...)):
     if file.content_type != "application/pdf":
         raise HTTPException(status_code=400, detail="Invalid file type. Only PDFs are allowed.")
 
@@ -130,21 +135,27 @@ async def upload_document(file: UploadFile = File(...)):
         raise HTTPException(status_code=400, detail="No filename provided.")
     
     file_path = os.path.join(upload_dir, file.filename)
+    # Written under a name the ingestion scan ignores (it only picks up *.pdf),
+    # then renamed into place, so a run in progress never sees a half-written PDF
+    partial_path = f"{file_path}.{uuid.uuid4().hex}.part"
 
     try:
-        with open(file_path, "wb") as buffer:
+        with open(partial_path, "wb") as buffer:
             shutil.copyfileobj(file.file, buffer)
+        os.replace(partial_path, file_path)
 
-        # After saving, trigger the ingestion process
-        print(f"File '{file.filename}' uploaded. Starting ingestion...")
-        process_pdfs_incrementally()
+        # After saving, queue the ingestion; poll /api/jobs/{job_id} for its status
+        job = ingestion_queue.submit([file.filename])
+        print(f"File '{file.filename}' uploaded. Queued ingestion job {job.id}.")
 
     except Exception as e:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
         raise HTTPException(status_code=500, detail=f"Failed to process file: {e}")
     finally:
         file.file.close()
 
-    return {"filename": file.filename, "message": "File uploaded and processed successfully."}
+    return {"filename": file.filename, "job_id": job.id, "message": "File uploaded. Ingestion has been queued."}
 
 
 @app.post("/api/analyze", summary="Analyze a Document")
@@ -159,35 +170,34 @@ def analyze_document(request: AnalyzeRequest):
 @app.get("/api/metadata", response_model=AllMetadataResponse, summary="Get All Document Metadata")
 def get_all_metadata():
     """Returns all editable metadata for every document."""
-    metadata = load_metadata_db()
+    metadata = cached_metadata_db()
     return {"metadata": metadata}
 
 @app.post("/api/metadata/{document_name}", summary="Update Document Metadata")
 def update_metadata(document_name: str, metadata: DocumentMetadata):
     """Updates the metadata for a specific document."""
-    db = load_metadata_db()
-    if document_name not in db:
-        raise HTTPException(status_code=404, detail="Document not found.")
-    
-    db[document_name] = metadata.model_dump()
-    save_metadata_db(db)
+    db = get_document_db()
+    # Check and write in one transaction, touching only this document's row
+    with db.transaction():
+        if db.get(METADATA_TABLE, document_name) is None:
+            raise HTTPException(status_code=404, detail="Document not found.")
+        db.put(METADATA_TABLE, document_name, metadata.model_dump())
     return {"message": "Metadata updated successfully."}
 
 @app.get("/api/cache/{document_name}", summary="Get Cached Analysis")
 def get_cached_analysis(document_name: str):
     """Checks for and returns a previously saved analysis for a document."""
-    cache = load_analysis_cache()
-    if document_name in cache:
-        return cache[document_name]
+    cached = load_cached_analysis(document_name)
+    if cached is not None:
+        return cached
     raise HTTPException(status_code=404, detail="No cached analysis found for this document.")
 
 @app.post("/api/cache/{document_name}", summary="Save Analysis Result")
 def save_analysis_to_cache(document_name: str, analysis_result: AnalysisResultModel):
     """Receives and persists a generated analysis result, validated against the model."""
-    cache = load_analysis_cache()
-    # Use .model_dump() to get a clean dictionary for JSON serialization
-    cache[document_name] = analysis_result.model_dump() 
-    save_analysis_cache(cache)
+    # Use .model_dump() to get a clean dictionary for JSON serialization; the row is
+    # visible to reads immediately and written to documents.db in the next batch
+    save_cached_analysis(document_name, analysis_result.model_dump())
     return {"message": "Analysis successfully saved."}
 
 
@@ -209,6 +219,7 @@ async def get_document(file_name: str):
 # --- The /generate_podcast endpoint using the standard OpenAI API ---
 @app.post("/api/generate_podcast")
 async def generate_podcast(request: PodcastRequest): # Accepts file_name via request body
+    client = get_openai_client()
     if not client:
         raise HTTPException(status_code=503, detail="OpenAI service is not configured on the server.")
 
@@ -218,11 +229,8 @@ async def generate_podcast(request: PodcastRequest): # Accepts file_name via req
         raise HTTPException(status_code=404, detail="Source PDF not found.")
 
     try:
-        # 1. Extract Text from PDF (No changes here)
-        text_content = ""
-        with fitz.open(pdf_path) as doc:
-            for page in doc:
-                text_content += page.get_text()
+        # 1. Read the opening pages' text from the page cache (the PDF is only parsed if it isn't cached)
+        text_content = read_document_text(request.file_name, max_chars=PODCAST_SOURCE_CHARS)
         
         if not text_content.strip():
             raise HTTPException(status_code=400, detail="Could not extract text from PDF.")
@@ -241,7 +249,7 @@ async def generate_podcast(request: PodcastRequest): # Accepts file_name via req
             model="gpt-4o",  # Use a standard, powerful model like gpt-4o or gpt-4-turbo
             messages=[
                 {"role": "system", "content": system_prompt},
-                {"role": "user", "content": text_content[:12000]} # Limit token usage
+                {"role": "user", "content": text_content}
             ],
             temperature=0.2,
         )
@@ -304,13 +312,55 @@ def chat_with_documents(request: ChatRequest):
         raise HTTPException(status_code=500, detail=f"An error occurred during chat: {str(e)}")
 
 
+@app.get("/api/cache_stats", summary="Get Cache Hit Rates")
+def get_cache_stats():
+    """Returns hit/miss counters of the in-process caches."""
+    db = get_document_db()
+    return {
+        "query_embeddings": EMBEDDINGS.stats(),
+        "metadata": db.cached(METADATA_TABLE).stats(),
+        "analysis_cache": db.indexed(ANALYSIS_CACHE_TABLE).stats(),
+        "analysis_cache_writes": ANALYSIS_CACHE_WRITER.stats(),
+        "dashboard": db.cached(DASHBOARD_TABLE).stats(),
+    }
+
+
 @app.post("/api/ingest", summary="Trigger PDF Ingestion")
 def ingest_documents():
+    job = ingestion_queue.submit()
+    return {"message": "Ingestion has been queued.", "job_id": job.id}
+
+@app.get("/api/jobs", summary="List Ingestion Jobs")
+def list_ingestion_jobs():
+    return {"jobs": [job.to_dict() for job in ingestion_queue.list_jobs()]}
+
+@app.get("/api/jobs/{job_id}", summary="Get Ingestion Job Status")
+def get_ingestion_job(job_id: str):
+    job = ingestion_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found.")
+    return job.to_dict()
+
+@app.post("/api/vector_store/vacuum", summary="Compact the Vector Index")
+def vacuum_index():
+    """Drops the dead vectors of modified or removed documents and returns before/after sizes."""
+    try:
+        return vacuum_vector_store()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Vacuum failed: {str(e)}")
+
+@app.post("/api/heatmap/rescore", summary="Recompute All Heatmaps")
+def rescore_all_heatmaps():
+    """
+    Recomputes every document's heatmap from mapping.csv (no LLM calls); returns the documents that changed.
+    Answers 409 instead of waiting while an ingestion or vacuum holds the store.
+    """
     try:
-        processed_files = process_pdfs_incrementally()
-        return {"message": "Ingestion process completed successfully.", "processed_files": processed_files}
+        return rescore_heatmaps(blocking=False)
+    except IngestionBusyError as e:
+        raise HTTPException(status_code=409, detail=f"{e} Retry the rescore once it has finished.")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Ingestion failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Rescore failed: {str(e)}")
 
 @app.get("/api/documents", response_model=DocumentListResponse, summary="List Processed Documents")
 def get_documents():
@@ -0,0 +1,160 @@
+import os
+import json
+import pickle
+import sqlite3
+import threading
+from langchain_core.documents import Document
+
+VECTOR_STORE_DIR = "data/vector_store"
+CHUNK_STORE_PATH = os.path.join(VECTOR_STORE_DIR, "chunks.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    vector_id INTEGER PRIMARY KEY,
+    source_file TEXT NOT NULL,
+    page INTEGER NOT NULL DEFAULT 0,
+    publication_date TEXT,
+    page_content TEXT NOT NULL,
+    metadata TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_chunks_source_file ON chunks (source_file, page, vector_id);
+"""
+
+
+class ChunkStore:
+    """
+    On-disk chunk store (SQLite) keyed by FAISS vector ID.
+    Replaces LangChain's pickled docstore: chunk text is fetched lazily for
+    just the hits being returned, and ingestion appends new rows without
+    rewriting existing ones. WAL mode lets the API keep reading while
+    ingestion writes.
+    """
+    def __init__(self, path: str = CHUNK_STORE_PATH):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        # SQLite connections can't be shared across threads; keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path)
+            self._local.conn = conn
+        return conn
+
+    def add_documents(self, docs: list[Document], vector_ids):
+        """Writes chunks under the given vector IDs, in one transaction."""
+        rows = [
+            (
+                int(vector_id),
+                doc.metadata.get("source_file"),
+                doc.metadata.get("page", 0),
+                doc.metadata.get("publication_date"),
+                doc.page_content,
+                json.dumps(doc.metadata),
+            )
+            for vector_id, doc in zip(vector_ids, docs)
+        ]
+        with self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def delete_from(self, first_vector_id: int):
+        """Drops rows at or beyond `first_vector_id` (left over from an interrupted ingestion)."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM chunks WHERE vector_id >= ?", (first_vector_id,))
+
+    def delete_files(self, source_files, below_vector_id: int | None = None) -> int:
+        """
+        Drops every chunk of the given source files (only those with IDs below
+        `below_vector_id`, if given) and returns how many rows were removed.
+        Their vectors stay in the index as dead entries, excluded from
+        searches, until the store is vacuumed.
+        """
+        source_files = list(source_files)
+        if not source_files:
+            return 0
+        placeholders = ",".join("?" * len(source_files))
+        query = f"DELETE FROM chunks WHERE source_file IN ({placeholders})"
+        params = source_files
+        if below_vector_id is not None:
+            query += " AND vector_id < ?"
+            params = source_files + [below_vector_id]
+        with self._connect() as conn:
+            return conn.execute(query, params).rowcount
+
+    def rename_file(self, old_name: str, new_name: str) -> int:
+        """Moves a file's chunks to a new source file name, keeping their vector IDs."""
+        with self._connect() as conn:
+            return conn.execute(
+                "UPDATE chunks SET source_file = ?, metadata = json_set(metadata, '$.source_file', ?) WHERE source_file = ?",
+                (new_name, new_name, old_name)
+            ).rowcount
+
+    def get_documents_by_id(self, vector_ids) -> dict[int, Document]:
+        """Fetches the given chunks keyed by vector ID. Unknown IDs are left out."""
+        vector_ids = [int(vector_id) for vector_id in vector_ids if vector_id >= 0]
+        if not vector_ids:
+            return {}
+        placeholders = ",".join("?" * len(vector_ids))
+        rows = self._connect().execute(
+            f"SELECT vector_id, page_content, metadata FROM chunks WHERE vector_id IN ({placeholders})",
+            vector_ids
+        ).fetchall()
+        return {vector_id: Document(page_content=content, metadata=json.loads(metadata)) for vector_id, content, metadata in rows}
+
+    def get_documents(self, vector_ids) -> list[Document]:
+        """Fetches the given chunks, preserving the order of `vector_ids`. Unknown IDs are skipped."""
+        by_id = self.get_documents_by_id(vector_ids)
+        return [by_id[int(vector_id)] for vector_id in vector_ids if int(vector_id) in by_id]
+
+    def get_doc_chunks(self, max_vector_id: int | None = None) -> dict[str, list[int]]:
+        """Source file -> chunk vector IDs in page order, optionally limited to IDs below `max_vector_id`."""
+        query = "SELECT source_file, vector_id FROM chunks"
+        params = ()
+        if max_vector_id is not None:
+            query += " WHERE vector_id < ?"
+            params = (max_vector_id,)
+        doc_chunks: dict[str, list[int]] = {}
+        for source_file, vector_id in self._connect().execute(query + " ORDER BY source_file, page, vector_id", params):
+            doc_chunks.setdefault(source_file, []).append(vector_id)
+        return doc_chunks
+
+    def get_publication_dates(self) -> dict[str, str | None]:
+        """Source file -> publication date (shared by all chunks of a file)."""
+        rows = self._connect().execute("SELECT source_file, MAX(publication_date) FROM chunks GROUP BY source_file")
+        return dict(rows.fetchall())
+
+    def count(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+
+def migrate_pickle_docstore(vector_store_dir: str = VECTOR_STORE_DIR) -> ChunkStore:
+    """
+    One-shot migration of LangChain's index.pkl (docstore + vector ID map)
+    into chunks.db. The pickle is left in place but is no longer read or written.
+    """
+    pickle_path = os.path.join(vector_store_dir, "index.pkl")
+    chunk_store = ChunkStore(os.path.join(vector_store_dir, "chunks.db"))
+    with open(pickle_path, "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    vector_ids = sorted(index_to_docstore_id)
+    docs = [docstore.search(index_to_docstore_id[vector_id]) for vector_id in vector_ids]
+    chunk_store.add_documents(
+        [doc for doc in docs if isinstance(doc, Document)],
+        [vector_id for vector_id, doc in zip(vector_ids, docs) if isinstance(doc, Document)]
+    )
+    print(f"Migrated {chunk_store.count()} chunks from {pickle_path} to {chunk_store.path}")
+    return chunk_store
+
+def open_chunk_store(vector_store_dir: str = VECTOR_STORE_DIR) -> ChunkStore:
+    """Opens chunks.db, migrating the legacy pickled docstore on first use."""
+    chunk_store = ChunkStore(os.path.join(vector_store_dir, "chunks.db"))
+    if chunk_store.count() == 0 and os.path.exists(os.path.join(vector_store_dir, "index.pkl")):
+        return migrate_pickle_docstore(vector_store_dir)
+    return chunk_store
+
+
+if __name__ == '__main__':
+    migrate_pickle_docstore()
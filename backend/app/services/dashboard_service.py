@@ -128,11 +128,13 @@
 #     return dashboard_data
 
 
-from .rag_builder import LLM, EMBEDDINGS, VECTOR_STORE_DIR
-from langchain_community.vectorstores import FAISS
+from .rag_builder import get_llm
+from .vector_store import vector_store_holder
+from .retrieval import filtered_similarity_search
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
-from .ingestion import load_metadata_db
+from .ingestion import cached_metadata_db
+from .facet_index import get_metadata_facets
 from datetime import datetime, timedelta
 
 def get_upcoming_dates(start_date: str, end_date: str) -> list[dict]:
@@ -147,25 +149,16 @@ def generate_dashboard_logic(start_date: str | None = None, end_date: str | None
     print(f"---DASHBOARD SERVICE: Generating overview for Start: {start_date}, End: {end_date}---")
     
     # --- 1. Filter documents based on provided date range ---
-    metadata_db = load_metadata_db()
-    all_filenames = list(metadata_db.keys())
-    print(all_filenames)
-    filtered_filenames = []
+    metadata_db = cached_metadata_db()
+    facets = get_metadata_facets()
 
     if start_date or end_date:
-        for fname in all_filenames:
-            pub_date_str = metadata_db.get(fname, {}).get("publication_date")
-            print(fname, pub_date_str)
-            if not pub_date_str: continue # Skip if no date
-            
-            is_after_start = not start_date or pub_date_str >= start_date
-            is_before_end = not end_date or pub_date_str <= end_date
-            
-            if is_after_start and is_before_end:
-                filtered_filenames.append(fname)
+        # Range lookup in the sorted publication dates; documents without a date are skipped
+        filtered_filenames = facets.published_between(start_date, end_date)
     else:
         # If no dates are provided, use all documents
-        filtered_filenames = all_filenames
+        filtered_filenames = list(metadata_db)
+    print(f"{len(filtered_filenames)} documents in range.")
 
     if not filtered_filenames:
         # Return a default structure if no documents match the filter
@@ -180,15 +173,13 @@ def generate_dashboard_logic(start_date: str | None = None, end_date: str | None
         }
 
     # --- 2. Perform RAG only on the filtered documents ---
-    def metadata_filter(metadata: dict) -> bool:
-        return metadata.get("source_file") in filtered_filenames
-
-    vector_store = FAISS.load_local(VECTOR_STORE_DIR, EMBEDDINGS, allow_dangerous_deserialization=True)
-    retriever = vector_store.as_retriever(
-        search_kwargs={"k": 50, "filter": metadata_filter}
+    # Restrict the search to the vector IDs of the filtered files
+    docs = filtered_similarity_search(
+        vector_store_holder.get(),
+        "Holistic overview of all key risks, impacts, and recommendations across all relevant financial regulations",
+        k=50,
+        source_files=set(filtered_filenames)
     )
-    
-    docs = retriever.invoke("Holistic overview of all key risks, impacts, and recommendations across all relevant financial regulations")
     docs_context = "\n\n---\n\n".join([d.page_content for d in docs])
 
 
@@ -212,7 +203,7 @@ def generate_dashboard_logic(start_date: str | None = None, end_date: str | None
         input_variables=["context"]
     )
 
-    chain = prompt | LLM | JsonOutputParser()
+    chain = prompt | get_llm() | JsonOutputParser()
     dashboard_data = chain.invoke({"context": docs_context})
 
     # --- 3. Add final data based on the filtered set ---
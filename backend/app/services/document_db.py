@@ -0,0 +1,470 @@
+import os
+import json
+import zlib
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+VECTOR_STORE_DIR = "data/vector_store"
+DOCUMENT_DB_PATH = os.path.join(VECTOR_STORE_DIR, "documents.db")
+
+# Tables of JSON values keyed by document name, and the JSON file each replaces
+METADATA_TABLE = "metadata"
+ANALYSIS_CACHE_TABLE = "analysis_cache"
+PROCESSED_FILES_TABLE = "processed_files"
+DASHBOARD_TABLE = "dashboard"
+LEGACY_JSON_FILES = {
+    METADATA_TABLE: "metadata_db.json",
+    ANALYSIS_CACHE_TABLE: "analysis_cache.json",
+    PROCESSED_FILES_TABLE: "processed_files.json",
+    DASHBOARD_TABLE: "dashboard_data.json",
+}
+# The saved dashboard is a single row of its table
+DASHBOARD_KEY = "dashboard"
+# Change counter (in table_versions, without a table) of the FAISS store on disk
+VECTOR_STORE_VERSION = "vector_store"
+# Tables of large values, stored as zlib-compressed JSON
+COMPRESSED_TABLES = {ANALYSIS_CACHE_TABLE}
+COMPRESSION_LEVEL = 6
+
+
+def encode_value(table: str, value):
+    text = json.dumps(value)
+    return zlib.compress(text.encode("utf-8"), COMPRESSION_LEVEL) if table in COMPRESSED_TABLES else text
+
+def decode_value(stored):
+    # Rows written before their table was compressed are still plain JSON text
+    return json.loads(zlib.decompress(stored) if isinstance(stored, bytes) else stored)
+
+
+class DocumentDB:
+    """
+    SQLite (WAL) store for the per-document JSON records that used to be
+    whole-file JSON "databases": one row per document, so a write touches
+    only that document and concurrent writers never lose each other's
+    updates. `transaction()` groups writes (also across tables) atomically.
+    """
+    def __init__(self, path: str = DOCUMENT_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS table_versions (name TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+        for table in LEGACY_JSON_FILES:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT NOT NULL, version INTEGER NOT NULL DEFAULT 0)")
+            # Stores created before per-row versions existed
+            if "version" not in [column[1] for column in conn.execute(f"PRAGMA table_info({table})")]:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_version ON {table} (version)")
+        conn.execute("CREATE TABLE IF NOT EXISTS migrations (name TEXT PRIMARY KEY)")
+        self._compress_tables()
+        self._caches: dict[str, TableCache] = {}
+        self._indexes: dict[str, TableIndex] = {}
+        self._caches_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        # SQLite connections can't be shared across threads; keep one per thread.
+        # Autocommit, with explicit transactions in transaction()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._local.conn = conn
+            self._local.depth = 0
+        return conn
+
+    def _compress_tables(self):
+        """One-shot rewrite of the plain-JSON rows of tables that are now compressed."""
+        for table in COMPRESSED_TABLES:
+            with self.transaction() as conn:
+                name = f"compress:{table}"
+                if conn.execute("SELECT 1 FROM migrations WHERE name = ?", (name,)).fetchone():
+                    continue
+                rows = conn.execute(f"SELECT key, value FROM {table} WHERE typeof(value) = 'text'").fetchall()
+                conn.executemany(
+                    f"UPDATE {table} SET value = ? WHERE key = ?",
+                    [(encode_value(table, json.loads(value)), key) for key, value in rows]
+                )
+                conn.execute("INSERT INTO migrations (name) VALUES (?)", (name,))
+
+    def in_transaction(self) -> bool:
+        self._connect()
+        return self._local.depth > 0
+
+    @contextmanager
+    def transaction(self):
+        """Runs the enclosed reads and writes as one write transaction (nested calls join it)."""
+        conn = self._connect()
+        if self._local.depth:
+            self._local.depth += 1
+            try:
+                yield conn
+            finally:
+                self._local.depth -= 1
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        self._local.depth = 1
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+        finally:
+            self._local.depth = 0
+
+    def get(self, table: str, key: str, default=None):
+        row = self._connect().execute(f"SELECT value FROM {table} WHERE key = ?", (key,)).fetchone()
+        return decode_value(row[0]) if row else default
+
+    def get_all(self, table: str) -> dict:
+        return {key: decode_value(value) for key, value in self._connect().execute(f"SELECT key, value FROM {table} ORDER BY rowid")}
+
+    def keys(self, table: str) -> list[str]:
+        return [key for (key,) in self._connect().execute(f"SELECT key FROM {table} ORDER BY rowid")]
+
+    def put(self, table: str, key: str, value):
+        self.put_many(table, {key: value})
+
+    def version(self, table: str) -> int:
+        """The table's change counter, bumped by every write (from any process)."""
+        row = self._connect().execute("SELECT version FROM table_versions WHERE name = ?", (table,)).fetchone()
+        return row[0] if row else 0
+
+    def bump_version(self, name: str) -> int:
+        """Bumps and returns a counter that has no table of its own (e.g. VECTOR_STORE_VERSION)."""
+        with self.transaction() as conn:
+            return self._bump_version(conn, name)
+
+    def _bump_version(self, conn: sqlite3.Connection, table: str) -> int:
+        # Called inside the write's transaction, so the bump commits or rolls back with it
+        conn.execute(
+            "INSERT INTO table_versions (name, version) VALUES (?, 1) ON CONFLICT(name) DO UPDATE SET version = version + 1",
+            (table,)
+        )
+        return self.version(table)
+
+    def put_many(self, table: str, items: dict):
+        if not items:
+            return
+        with self.transaction() as conn:
+            version = self._bump_version(conn, table)
+            conn.executemany(
+                f"INSERT INTO {table} (key, value, version) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, version = excluded.version",
+                [(key, encode_value(table, value), version) for key, value in items.items()]
+            )
+
+    def delete(self, table: str, keys) -> int:
+        with self.transaction() as conn:
+            deleted = sum(conn.execute(f"DELETE FROM {table} WHERE key = ?", (key,)).rowcount for key in keys)
+            if deleted:
+                self._bump_version(conn, table)
+            return deleted
+
+    def update(self, table: str, key: str, fn):
+        """
+        Read-modify-write of one row in a single transaction: stores and
+        returns `fn(current value or None)`, or deletes the row if it returns None.
+        """
+        with self.transaction():
+            value = fn(self.get(table, key))
+            if value is None:
+                self.delete(table, [key])
+            else:
+                self.put(table, key, value)
+            return value
+
+    def replace_all(self, table: str, items: dict):
+        """Makes the table hold exactly `items` (rows whose value is unchanged are not rewritten)."""
+        with self.transaction():
+            current = self.get_all(table)
+            self.delete(table, [key for key in current if key not in items])
+            self.put_many(table, {key: value for key, value in items.items() if key not in current or current[key] != value})
+
+    def cached(self, table: str) -> "TableCache":
+        """The process-wide read-through cache of `table`."""
+        with self._caches_lock:
+            if table not in self._caches:
+                self._caches[table] = TableCache(self, table)
+            return self._caches[table]
+
+    def indexed(self, table: str) -> "TableIndex":
+        """The process-wide key/version index of `table`, for tables too large to cache whole."""
+        with self._caches_lock:
+            if table not in self._indexes:
+                self._indexes[table] = TableIndex(self, table)
+            return self._indexes[table]
+
+
+class TableCache:
+    """
+    Read-through, in-memory copy of one table for the read endpoints. Each
+    read costs one lookup of the table's version counter; only when it moved
+    (a write here or in another process, e.g. a CLI ingestion) are the rows
+    written since the cached version fetched and parsed, and deleted keys
+    dropped. The returned values are shared: treat them as read-only.
+    """
+    def __init__(self, db: DocumentDB, table: str):
+        self.db = db
+        self.table = table
+        self._rows: dict = {}
+        self._version = -1
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self.hits = 0
+        self.misses = 0
+        self.rows_parsed = 0
+
+    def subscribe(self, fn):
+        """
+        Calls `fn(changed_rows, removed_keys)` with the current rows now and
+        with the delta of every later refresh, so derived indexes can be
+        maintained incrementally.
+        """
+        with self._lock:
+            fn(dict(self._rows), [])
+            self._subscribers.append(fn)
+
+    def _refresh(self) -> dict:
+        # Inside a write transaction the rows may still be rolled back; read them uncached
+        if self.db.in_transaction():
+            return self.db.get_all(self.table)
+        with self._lock:
+            version = self.db.version(self.table)
+            if version == self._version:
+                self.hits += 1
+                return self._rows
+            self.misses += 1
+            conn = self.db._connect()
+            changed = conn.execute(f"SELECT key, value FROM {self.table} WHERE version > ?", (self._version,)).fetchall()
+            parsed = {key: decode_value(value) for key, value in changed}
+            self.rows_parsed += len(parsed)
+            rows = {**self._rows, **parsed}
+            # Rebuilt in table order, which also drops deleted keys (cheap: no parsing)
+            previous, self._rows = self._rows, {key: rows[key] for key in self.db.keys(self.table) if key in rows}
+            self._version = version
+            if self._subscribers:
+                updated = {key: value for key, value in parsed.items() if key in self._rows}
+                removed = [key for key in previous if key not in self._rows]
+                for fn in self._subscribers:
+                    fn(updated, removed)
+            return self._rows
+
+    def get_all(self) -> dict:
+        return self._refresh()
+
+    def get(self, key: str, default=None):
+        return self._refresh().get(key, default)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "rows_parsed": self.rows_parsed,
+            "entries": len(self._rows),
+        }
+
+
+class TableIndex:
+    """
+    In-memory index of which keys a table holds and the version that last
+    wrote each, kept current like TableCache but without loading any
+    values: memory stays flat however large the rows are. `get` reads and
+    decodes only the requested row, and answers absent keys without
+    touching the database.
+    """
+    def __init__(self, db: DocumentDB, table: str):
+        self.db = db
+        self.table = table
+        self._versions: dict[str, int] = {}
+        self._version = -1
+        self._lock = threading.Lock()
+        self.reads = 0
+        self.absent = 0
+
+    def versions(self) -> dict[str, int]:
+        if self.db.in_transaction():
+            return dict(self.db._connect().execute(f"SELECT key, version FROM {self.table}"))
+        with self._lock:
+            version = self.db.version(self.table)
+            if version != self._version:
+                changed = self.db._connect().execute(f"SELECT key, version FROM {self.table} WHERE version > ?", (self._version,))
+                versions = {**self._versions, **dict(changed)}
+                self._versions = {key: versions[key] for key in self.db.keys(self.table) if key in versions}
+                self._version = version
+            return self._versions
+
+    def get(self, key: str, default=None):
+        if key not in self.versions():
+            self.absent += 1
+            return default
+        self.reads += 1
+        return self.db.get(self.table, key, default)
+
+    def stats(self) -> dict:
+        return {"entries": len(self._versions), "row_reads": self.reads, "absent_lookups": self.absent}
+
+
+class WriteBehindTable:
+    """
+    Write-behind buffer in front of one table for bursty single-row writes
+    (e.g. bulk-saved analyses). `put` only records the row in memory, where
+    reads see it at once; repeated writes to a row coalesce, and a flusher
+    thread writes everything pending in one transaction every
+    `flush_interval` seconds, or as soon as `max_pending` rows are waiting.
+    Until `start()` (and after `stop()`, which flushes), writes go straight
+    to the table.
+    """
+    def __init__(self, table: str, flush_interval: float = 2.0, max_pending: int = 100):
+        self.table = table
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: dict = {}
+        # The batch being written, still served to reads until it has committed
+        self._flushing: dict = {}
+        self._condition = threading.Condition()
+        # Serializes flushes, so an older batch never lands after a newer one
+        self._flush_lock = threading.Lock()
+        self._worker: threading.Thread | None = None
+        self._stopping = False
+        self.writes = 0
+        self.flushes = 0
+        self.rows_flushed = 0
+
+    def start(self):
+        with self._condition:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._stopping = False
+            self._worker = threading.Thread(target=self._run, name=f"{self.table}-writer", daemon=True)
+            self._worker.start()
+
+    def stop(self):
+        """Stops the flusher and writes out everything still pending."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+            worker = self._worker
+        if worker is not None:
+            worker.join()
+        self.flush()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._stopping and len(self._pending) < self.max_pending:
+                    self._condition.wait(self.flush_interval)
+                if self._stopping:
+                    return
+            try:
+                self.flush()
+            except Exception as e:
+                # The rows stay pending and are retried on the next round
+                print(f"WARNING: Flushing {self.table} failed: {e}")
+
+    def put(self, key: str, value):
+        with self._condition:
+            self._pending[key] = value
+            self.writes += 1
+            running = self._worker is not None and self._worker.is_alive() and not self._stopping
+            if running and len(self._pending) >= self.max_pending:
+                self._condition.notify_all()
+        if not running:
+            self.flush()
+
+    def get(self, key: str, default=None):
+        """The pending value of `key`, else its stored value (read through the table's key index)."""
+        with self._condition:
+            for rows in (self._pending, self._flushing):
+                if key in rows:
+                    return rows[key]
+        return get_document_db().indexed(self.table).get(key, default)
+
+    def get_all(self) -> dict:
+        with self._condition:
+            pending = {**self._flushing, **self._pending}
+        return {**get_document_db().get_all(self.table), **pending}
+
+    def flush(self) -> int:
+        """Writes the pending rows in one transaction. Returns how many."""
+        with self._flush_lock:
+            with self._condition:
+                batch, self._pending = self._pending, {}
+                self._flushing = batch
+            if not batch:
+                return 0
+            try:
+                get_document_db().put_many(self.table, batch)
+            except BaseException:
+                # Put the batch back, unless a row was written again meanwhile
+                with self._condition:
+                    self._pending = {**batch, **self._pending}
+                raise
+            finally:
+                with self._condition:
+                    self._flushing = {}
+            self.flushes += 1
+            self.rows_flushed += len(batch)
+            return len(batch)
+
+    def stats(self) -> dict:
+        return {
+            "writes": self.writes,
+            "flushes": self.flushes,
+            "rows_flushed": self.rows_flushed,
+            "pending": len(self._pending),
+        }
+
+
+def migrate_json_files(db: DocumentDB, vector_store_dir: str = VECTOR_STORE_DIR) -> int:
+    """
+    One-shot migration of the legacy JSON files into their tables. Each file
+    is imported once (recorded in `migrations`) and then left in place, but no
+    longer read or written. Returns the number of files migrated.
+    """
+    migrated = 0
+    for table, file_name in LEGACY_JSON_FILES.items():
+        path = os.path.join(vector_store_dir, file_name)
+        if not os.path.exists(path):
+            continue
+        with db.transaction() as conn:
+            if conn.execute("SELECT 1 FROM migrations WHERE name = ?", (file_name,)).fetchone():
+                continue
+            try:
+                with open(path, 'r') as f:
+                    data = json.load(f)
+            except json.JSONDecodeError:
+                print(f"WARNING: {path} is not valid JSON; nothing migrated from it.")
+                data = {}
+            items = {DASHBOARD_KEY: data} if table == DASHBOARD_TABLE and data else data
+            db.put_many(table, items)
+            conn.execute("INSERT INTO migrations (name) VALUES (?)", (file_name,))
+        print(f"Migrated {len(items)} records from {path} to {db.path} ({table}).")
+        migrated += 1
+    return migrated
+
+def open_document_db(vector_store_dir: str = VECTOR_STORE_DIR) -> DocumentDB:
+    """Opens documents.db, migrating the legacy JSON files on first use."""
+    db = DocumentDB(os.path.join(vector_store_dir, "documents.db"))
+    migrate_json_files(db, vector_store_dir)
+    return db
+
+
+_document_db: DocumentDB | None = None
+_document_db_lock = threading.Lock()
+
+def get_document_db() -> DocumentDB:
+    """The process-wide store, opened (and migrated) on first use."""
+    global _document_db
+    with _document_db_lock:
+        if _document_db is None:
+            _document_db = open_document_db()
+        return _document_db
+
+
+if __name__ == '__main__':
+    migrate_json_files(DocumentDB())
@@ -0,0 +1,253 @@
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from .index_factory import get_vector_ids
+
+VECTOR_STORE_DIR = "data/vector_store"
+EMBEDDING_CACHE_PATH = os.path.join(VECTOR_STORE_DIR, "embedding_cache.db")
+
+QUERY_CACHE_MEMORY_ENTRIES = 1024
+QUERY_CACHE_DISK_ENTRIES = 50000
+# Chunk embeddings are only reused across ingestion runs, so they skip the memory tier
+CHUNK_CACHE_DISK_ENTRIES = 2000000
+# Check the disk tier's size only every N writes, not on every insert
+EVICTION_CHECK_INTERVAL = 100
+
+
+def normalize_query(text: str) -> str:
+    """Collapses whitespace so trivially different spellings of a query share one entry."""
+    return " ".join(text.split())
+
+def embedding_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\x00{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache: an in-memory LRU in front of a size-bounded
+    SQLite table. Entries are evicted least-recently-used from both tiers.
+    """
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, namespace: str = "query",
+                 memory_entries: int = QUERY_CACHE_MEMORY_ENTRIES, disk_entries: int = QUERY_CACHE_DISK_ENTRIES):
+        self.path = path
+        self.table = f"{namespace}_embeddings"
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self._memory: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._memory_lock = threading.Lock()
+        self._local = threading.local()
+        self._writes_since_check = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {self.table} (key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.table}_last_used ON {self.table} (last_used)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # SQLite connections can't be shared across threads; keep one per thread.
+        # Ingestion writes while API threads read; wait for each other's transactions
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=60)
+            self._local.conn = conn
+        return conn
+
+    def _remember(self, key: str, vector: np.ndarray):
+        with self._memory_lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def get_many(self, keys: list[str]) -> dict[str, np.ndarray]:
+        """Returns the cached vectors for the keys that are present in either tier."""
+        found: dict[str, np.ndarray] = {}
+        with self._memory_lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+            self.memory_hits += len(found)
+
+        missing = [key for key in dict.fromkeys(keys) if key not in found]
+        if missing:
+            conn = self._connect()
+            placeholders = ",".join("?" * len(missing))
+            rows = conn.execute(f"SELECT key, vector FROM {self.table} WHERE key IN ({placeholders})", missing).fetchall()
+            if rows:
+                with conn:
+                    conn.executemany(f"UPDATE {self.table} SET last_used = ? WHERE key = ?", [(time.time(), key) for key, _ in rows])
+            for key, blob in rows:
+                vector = np.frombuffer(blob, dtype="float32")
+                found[key] = vector
+                self._remember(key, vector)
+            with self._memory_lock:
+                self.disk_hits += len(rows)
+                self.misses += len(missing) - len(rows)
+        return found
+
+    def put_many(self, items: dict[str, np.ndarray]):
+        if not items:
+            return
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO {self.table} (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, np.asarray(vector, dtype="float32").tobytes(), now) for key, vector in items.items()]
+            )
+        for key, vector in items.items():
+            self._remember(key, np.asarray(vector, dtype="float32"))
+        with self._memory_lock:
+            self._writes_since_check += len(items)
+            evict = self._writes_since_check >= EVICTION_CHECK_INTERVAL
+            if evict:
+                self._writes_since_check = 0
+        if evict:
+            self._evict()
+
+    def count(self) -> int:
+        return self._connect().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def _evict(self):
+        """Trims the disk tier to `disk_entries`, dropping the least recently used rows."""
+        with self._connect() as conn:
+            excess = self.count() - self.disk_entries
+            if excess > 0:
+                conn.execute(
+                    f"DELETE FROM {self.table} WHERE key IN (SELECT key FROM {self.table} ORDER BY last_used LIMIT ?)",
+                    (excess,)
+                )
+
+    def stats(self) -> dict:
+        with self._memory_lock:
+            memory_hits, disk_hits, misses, memory_entries = self.memory_hits, self.disk_hits, self.misses, len(self._memory)
+        lookups = memory_hits + disk_hits + misses
+        return {
+            "memory_hits": memory_hits,
+            "disk_hits": disk_hits,
+            "misses": misses,
+            "hit_rate": (memory_hits + disk_hits) / lookups if lookups else 0.0,
+            "memory_entries": memory_entries,
+        }
+
+
+class LazyEmbeddings(Embeddings):
+    """
+    Defers building an embeddings client (and importing its SDK) until the
+    first embedding call. `model` is known up front so cache keys don't
+    need the client.
+    """
+    def __init__(self, factory, model: str):
+        self.factory = factory
+        self.model = model
+        self._embeddings: Embeddings | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        if self._embeddings is None:
+            with self._lock:
+                if self._embeddings is None:
+                    self._embeddings = self.factory()
+        return self._embeddings
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embeddings.embed_query(text)
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """
+    Wraps an embeddings client so repeated and templated query texts skip the
+    embedding round trip. Keys combine the model name and the normalized text.
+    Batched calls only send the texts that missed the cache. Without an
+    explicit `cache`, the default one (and its database file) is opened on
+    the first embedding call, not at construction.
+    """
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache | None = None):
+        self.embeddings = embeddings
+        self.model = getattr(embeddings, "model", type(embeddings).__name__)
+        self._cache = cache
+        self._cache_lock = threading.Lock()
+        # Texts served from the cache vs sent to the embeddings API
+        self.reused = 0
+        self.computed = 0
+        self._counter_lock = threading.Lock()
+
+    def make_cache(self) -> EmbeddingCache:
+        return EmbeddingCache()
+
+    @property
+    def cache(self) -> EmbeddingCache:
+        if self._cache is None:
+            with self._cache_lock:
+                if self._cache is None:
+                    self._cache = self.make_cache()
+        return self._cache
+
+    def key(self, text: str) -> str:
+        return embedding_key(self.model, normalize_query(text))
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys = [self.key(text) for text in texts]
+        found = self.cache.get_many(keys)
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            new_items = {key: np.asarray(vector, dtype="float32") for key, vector in zip(missing, vectors)}
+            self.cache.put_many(new_items)
+            found.update(new_items)
+        with self._counter_lock:
+            self.computed += len(missing)
+            self.reused += len(keys) - len(missing)
+        return [found[key].tolist() for key in keys]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+    def stats(self) -> dict:
+        return self.cache.stats()
+
+
+class CachedChunkEmbeddings(CachedQueryEmbeddings):
+    """
+    Content-hash cache for document chunks: the key is a hash of the exact
+    chunk text and the model, so re-ingesting a modified PDF only embeds the
+    chunks whose text actually changed.
+    """
+    def make_cache(self) -> EmbeddingCache:
+        return EmbeddingCache(namespace="chunk", memory_entries=0, disk_entries=CHUNK_CACHE_DISK_ENTRIES)
+
+    def key(self, text: str) -> str:
+        return embedding_key(self.model, text)
+
+    def seed_from_index(self, index, chunk_store, batch_size: int = 1000) -> int:
+        """
+        Fills an empty cache with the vectors already stored in a full-precision
+        index, so the first re-ingestion after enabling the cache reuses them.
+        """
+        if self.cache.count() > 0 or index.ntotal == 0:
+            return 0
+        seeded = 0
+        all_vector_ids = get_vector_ids(index)
+        for start in range(0, len(all_vector_ids), batch_size):
+            # Dead or vacuumed IDs have no chunk; seed the rest of the batch
+            docs = chunk_store.get_documents_by_id(all_vector_ids[start:start + batch_size])
+            if not docs:
+                continue
+            vector_ids = np.fromiter(docs, dtype="int64", count=len(docs))
+            vectors = index.reconstruct_batch(vector_ids)
+            self.cache.put_many({self.key(docs[int(vector_id)].page_content): vector for vector_id, vector in zip(vector_ids, vectors)})
+            seeded += len(docs)
+        return seeded
@@ -0,0 +1,100 @@
+import threading
+from bisect import bisect_left, bisect_right
+from .document_db import get_document_db, METADATA_TABLE
+
+
+def _lowered(values) -> set[str]:
+    return {value.lower() for value in values or [] if isinstance(value, str)}
+
+
+class FacetIndex:
+    """
+    Inverted indexes over document metadata: postings sets of documents per
+    (lower-cased) tag and region, and the publication dates as a sorted
+    array searched with bisect. Filters resolve to set intersections and a
+    range slice instead of scanning every document. `apply` updates it with
+    the documents that changed, so it never needs a full rebuild.
+    """
+    def __init__(self):
+        self.documents: set[str] = set()
+        self.tags: dict[str, set[str]] = {}
+        self.regions: dict[str, set[str]] = {}
+        # Parallel arrays sorted by date (ISO "YYYY-MM-DD" strings sort chronologically)
+        self._dates: list[str] = []
+        self._dated_names: list[str] = []
+        self._facets: dict[str, tuple[set[str], set[str], str | None]] = {}
+        self._lock = threading.Lock()
+
+    def _remove(self, name: str):
+        tags, regions, date = self._facets.pop(name)
+        for postings, values in ((self.tags, tags), (self.regions, regions)):
+            for value in values:
+                postings[value].discard(name)
+                if not postings[value]:
+                    del postings[value]
+        if date is not None:
+            i = bisect_left(self._dates, date)
+            i += self._dated_names[i:bisect_right(self._dates, date)].index(name)
+            del self._dates[i], self._dated_names[i]
+        self.documents.discard(name)
+
+    def _add(self, name: str, meta: dict):
+        tags, regions = _lowered(meta.get("tags")), _lowered(meta.get("regions"))
+        date = meta.get("publication_date")
+        date = date if isinstance(date, str) and date else None
+        self._facets[name] = (tags, regions, date)
+        for postings, values in ((self.tags, tags), (self.regions, regions)):
+            for value in values:
+                postings.setdefault(value, set()).add(name)
+        if date is not None:
+            i = bisect_right(self._dates, date)
+            self._dates.insert(i, date)
+            self._dated_names.insert(i, name)
+        self.documents.add(name)
+
+    def apply(self, changed: dict, removed=()):
+        """Re-indexes the `changed` documents' metadata and drops the `removed` ones."""
+        with self._lock:
+            for name in list(removed) + list(changed):
+                if name in self._facets:
+                    self._remove(name)
+            for name, meta in changed.items():
+                self._add(name, meta or {})
+
+    def match(self, tags: list[str] | None = None, regions: list[str] | None = None) -> set[str]:
+        """Documents carrying every given tag and every given region (case-insensitive)."""
+        with self._lock:
+            postings = [self.tags.get(tag, set()) for tag in _lowered(tags)]
+            postings += [self.regions.get(region, set()) for region in _lowered(regions)]
+            if not postings:
+                return set(self.documents)
+            # Intersect starting from the rarest value
+            postings.sort(key=len)
+            return postings[0].intersection(*postings[1:])
+
+    def published_between(self, start_date: str | None = None, end_date: str | None = None) -> list[str]:
+        """Documents with a publication date in [start_date, end_date] (either bound optional), oldest first."""
+        with self._lock:
+            start = bisect_left(self._dates, start_date) if start_date else 0
+            stop = bisect_right(self._dates, end_date) if end_date else len(self._dates)
+            return self._dated_names[start:stop]
+
+
+_metadata_facets: FacetIndex | None = None
+_metadata_facets_lock = threading.Lock()
+
+def get_metadata_facets() -> FacetIndex:
+    """
+    The facet index of the metadata table, kept current through the
+    table's in-process cache: only rows written since the last call are
+    re-indexed.
+    """
+    global _metadata_facets
+    cache = get_document_db().cached(METADATA_TABLE)
+    with _metadata_facets_lock:
+        if _metadata_facets is None:
+            _metadata_facets = FacetIndex()
+            cache.subscribe(_metadata_facets.apply)
+    # Picks up writes made since the last refresh (here or in another process)
+    cache.get_all()
+    return _metadata_facets
@@ -0,0 +1,117 @@
+import os
+import csv
+import threading
+import numpy as np
+
+MAPPING_CSV_PATH = "./data/mapping.csv"
+BUSINESS_DIVISIONS = ["AMO", "COO Ops Americas", "COO Ops S&I", "GOTO Operations & COO", "IB Operations (BA)", "P&C Operations", "Treasury"]
+# Minimum summed score per level; any positive score below them is "Low"
+HEATMAP_THRESHOLDS = {"High": 30, "Medium": 10}
+
+
+class MappingMatrix:
+    """
+    mapping.csv compiled into a lifecycle x division score matrix, so the
+    heatmap of any set of lifecycles is one row-sum instead of a loop with an
+    int() per cell. Rows sharing a lifecycle name are summed into one row,
+    and non-numeric cells count as 0, as before.
+    """
+    def __init__(self, rows: list[dict], divisions: list[str] = BUSINESS_DIVISIONS):
+        # The raw CSV rows, for building prompts
+        self.rows = rows
+        self.divisions = list(divisions)
+        self.lifecycles = list(dict.fromkeys(row['Lifecycle'] for row in rows))
+        self.lifecycle_index = {name: i for i, name in enumerate(self.lifecycles)}
+        self.scores = np.zeros((len(self.lifecycles), len(self.divisions)), dtype="int64")
+        for row in rows:
+            i = self.lifecycle_index[row['Lifecycle']]
+            for j, division in enumerate(self.divisions):
+                try:
+                    self.scores[i, j] += int(row.get(division, 0))
+                except (ValueError, TypeError):
+                    continue
+
+    def _rows(self, lifecycles) -> list[int]:
+        return list({self.lifecycle_index[name] for name in lifecycles if isinstance(name, str) and name in self.lifecycle_index})
+
+    def score(self, lifecycles: list[str]) -> np.ndarray:
+        """Division scores for one document's lifecycles (unknown names are ignored)."""
+        return self.scores[self._rows(lifecycles)].sum(axis=0)
+
+    def score_many(self, lifecycle_lists: list[list[str]]) -> np.ndarray:
+        """Division scores (documents x divisions) for many documents in one matrix product."""
+        selection = np.zeros((len(lifecycle_lists), len(self.lifecycles)), dtype="int64")
+        for doc, lifecycles in enumerate(lifecycle_lists):
+            selection[doc, self._rows(lifecycles)] = 1
+        return selection @ self.scores
+
+
+_matrix_cache: dict[str, tuple[tuple[int, int], MappingMatrix]] = {}
+_matrix_lock = threading.Lock()
+
+def load_mapping_matrix(path: str = MAPPING_CSV_PATH) -> MappingMatrix:
+    """Returns the compiled mapping, recompiling it only when the CSV's mtime or size changes."""
+    stat = os.stat(path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    with _matrix_lock:
+        cached = _matrix_cache.get(path)
+        if cached is None or cached[0] != stamp:
+            with open(path, mode='r', encoding='utf-8') as infile:
+                cached = (stamp, MappingMatrix([row for row in csv.DictReader(infile)]))
+            _matrix_cache[path] = cached
+        return cached[1]
+
+def heatmap_levels(scores: np.ndarray, thresholds: dict = HEATMAP_THRESHOLDS) -> np.ndarray:
+    return np.select(
+        [scores >= thresholds["High"], scores >= thresholds["Medium"], scores > 0],
+        ["High", "Medium", "Low"], default="None"
+    )
+
+def build_heatmap(scores: np.ndarray, divisions: list[str] = BUSINESS_DIVISIONS, thresholds: dict = HEATMAP_THRESHOLDS) -> dict:
+    """The `heatmapData` entry for one document's division scores."""
+    levels = heatmap_levels(scores, thresholds)
+    return {division: {"score": int(score), "level": str(level)} for division, score, level in zip(divisions, scores, levels)}
+
+def heatmap_tags(heatmap_data: dict) -> list[str]:
+    """Division tags (e.g. "COO", "P&C") of every division with some impact."""
+    return sorted({division.split(' ')[0] for division, entry in heatmap_data.items() if entry["level"] != "None"})
+
+def heatmap_regions(regions: list[str], heatmap_data: dict) -> list[str]:
+    """
+    The document's regions: the extracted ones plus "Americas" when an
+    Americas division is impacted, or ["Global"] if there are none.
+    """
+    regions = list(regions)
+    if any("Americas" in division and entry["level"] != "None" for division, entry in heatmap_data.items()):
+        regions.append("Americas")
+    return sorted(set(regions)) if regions else ["Global"]
+
+def rescore_metadata(metadata_db: dict, matrix: MappingMatrix | None = None, thresholds: dict = HEATMAP_THRESHOLDS) -> list[str]:
+    """
+    Recomputes `heatmapData` of every document from its stored
+    `impactedLifecycles` in one pass, without any LLM calls (e.g. after
+    mapping.csv or the thresholds changed). Division tags and the derived
+    "Americas" region follow the new heatmap; other tags and regions are
+    left as they are. Updates `metadata_db` in place and returns the
+    documents whose heatmap or regions changed.
+    """
+    matrix = matrix or load_mapping_matrix()
+    names = list(metadata_db)
+    scores = matrix.score_many([metadata_db[name].get("impactedLifecycles") or [] for name in names])
+    division_tags = {division.split(' ')[0] for division in matrix.divisions}
+    changed = []
+    for name, document_scores in zip(names, scores):
+        meta = metadata_db[name]
+        heatmap_data = build_heatmap(document_scores, matrix.divisions, thresholds)
+        # "Americas" and the ["Global"] fallback are derived; re-derive them from the new heatmap
+        extracted_regions = [region for region in meta.get("regions", []) if region != "Americas"]
+        if extracted_regions == ["Global"]:
+            extracted_regions = []
+        regions = heatmap_regions(extracted_regions, heatmap_data)
+        if meta.get("heatmapData") != heatmap_data or meta.get("regions") != regions:
+            changed.append(name)
+        meta["heatmapData"] = heatmap_data
+        meta["regions"] = regions
+        other_tags = [tag for tag in meta.get("tags", []) if tag not in division_tags]
+        meta["tags"] = sorted(set(other_tags) | set(heatmap_tags(heatmap_data)))
+    return changed
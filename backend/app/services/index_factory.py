@@ -0,0 +1,269 @@
+import os
+import json
+import math
+import argparse
+import numpy as np
+import faiss
+
+VECTOR_STORE_DIR = "data/vector_store"
+INDEX_CONFIG_PATH = os.path.join(VECTOR_STORE_DIR, "index_config.json")
+
+INDEX_TYPES = ["flat", "ivf_flat", "ivf_pq", "hnsw"]
+# How vectors are stored: full precision, half precision, or 8-bit scalar quantized
+STORAGE_MODES = {
+    "float32": None,
+    "float16": faiss.ScalarQuantizer.QT_fp16,
+    "sq8": faiss.ScalarQuantizer.QT_8bit,
+}
+STORAGE_FACTORY_NAMES = {"float16": "SQfp16", "sq8": "SQ8"}
+
+# Memory-mapped, read-only loading of the vector codes (flat, SQ, HNSW and IVF
+# storage). Older FAISS builds without this flag fall back to a full read.
+MMAP_READ_FLAGS = faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY if hasattr(faiss, "IO_FLAG_MMAP_IFC") else None
+
+DEFAULT_INDEX_CONFIG = {
+    "type": "flat",
+    # Vector precision (see STORAGE_MODES) and whether the API server memory-maps the index
+    "storage": "float32",
+    "mmap": True,
+    # IVF: number of inverted lists (None = derived from the corpus size) and lists probed per query
+    "nlist": None,
+    "nprobe": 16,
+    # IVF-PQ: sub-quantizers (must divide the dimension) and bits per code
+    "pq_m": 64,
+    "pq_nbits": 8,
+    # HNSW: graph degree, build-time and search-time beam widths
+    "hnsw_m": 32,
+    "ef_construction": 200,
+    "ef_search": 128,
+}
+# Upper bound for the efSearch of a selective filtered HNSW search
+MAX_FILTERED_EF_SEARCH = 4096
+
+# FAISS recommends at least this many training points per IVF centroid
+MIN_POINTS_PER_CENTROID = 39
+
+
+def load_index_config(path: str = INDEX_CONFIG_PATH) -> dict:
+    """Loads the persisted index configuration, falling back to the defaults."""
+    config = dict(DEFAULT_INDEX_CONFIG)
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            try:
+                config.update(json.load(f))
+            except json.JSONDecodeError:
+                pass
+    return config
+
+def save_index_config(config: dict, path: str = INDEX_CONFIG_PATH):
+    with open(path, 'w') as f:
+        json.dump(config, f, indent=2)
+
+
+def _choose_nlist(config: dict, n_vectors: int) -> int:
+    """Uses the configured nlist, or ~4*sqrt(n), capped so every centroid gets enough training points."""
+    nlist = config.get("nlist") or int(4 * math.sqrt(n_vectors))
+    return max(1, min(nlist, n_vectors // MIN_POINTS_PER_CENTROID))
+
+def build_index(vectors: np.ndarray, config: dict, ids: np.ndarray | None = None) -> faiss.Index:
+    """
+    Builds a FAISS index of the configured type (L2 metric, like the LangChain
+    default), trains it on `vectors` if needed and adds them in order, so
+    vector IDs match the row positions. With `ids`, the index is wrapped in an
+    IndexIDMap2 that stores those IDs instead (used after deletions).
+    """
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    n_vectors, dimension = vectors.shape
+    index_type = config.get("type", "flat")
+    storage = config.get("storage", "float32")
+    if storage not in STORAGE_MODES:
+        raise ValueError(f"Unknown storage mode '{storage}'. Expected one of {list(STORAGE_MODES)}.")
+    quantizer_type = STORAGE_MODES[storage]
+
+    if index_type == "flat":
+        if quantizer_type is None:
+            index = faiss.IndexFlatL2(dimension)
+        else:
+            index = faiss.IndexScalarQuantizer(dimension, quantizer_type, faiss.METRIC_L2)
+    elif index_type == "ivf_flat":
+        codes = STORAGE_FACTORY_NAMES.get(storage, "Flat")
+        index = faiss.index_factory(dimension, f"IVF{_choose_nlist(config, n_vectors)},{codes}")
+    elif index_type == "ivf_pq":
+        pq_m = config["pq_m"]
+        if dimension % pq_m != 0:
+            raise ValueError(f"pq_m={pq_m} must divide the vector dimension {dimension}.")
+        # PQ codebooks need 2^nbits training points each
+        pq_nbits = min(config["pq_nbits"], max(1, int(math.log2(max(2, n_vectors // MIN_POINTS_PER_CENTROID)))))
+        index = faiss.index_factory(dimension, f"IVF{_choose_nlist(config, n_vectors)},PQ{pq_m}x{pq_nbits}")
+    elif index_type == "hnsw":
+        if quantizer_type is None:
+            index = faiss.IndexHNSWFlat(dimension, config["hnsw_m"])
+        else:
+            index = faiss.IndexHNSWSQ(dimension, quantizer_type, config["hnsw_m"])
+        index.hnsw.efConstruction = config["ef_construction"]
+    else:
+        raise ValueError(f"Unknown index type '{index_type}'. Expected one of {INDEX_TYPES}.")
+
+    if not index.is_trained:
+        index.train(vectors)
+    if ids is not None:
+        index = faiss.IndexIDMap2(index)
+        index.add_with_ids(vectors, np.ascontiguousarray(ids, dtype="int64"))
+    else:
+        index.add(vectors)
+
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        # Needed to reconstruct stored vectors by ID (filtered subset scans)
+        ivf.make_direct_map()
+    apply_search_params(index, config)
+    return index
+
+def base_index(index: faiss.Index) -> faiss.Index:
+    """Returns the index that stores the vectors, unwrapping an ID map."""
+    if isinstance(index, faiss.IndexIDMap):
+        return faiss.downcast_index(index.index)
+    return index
+
+def apply_search_params(index: faiss.Index, config: dict):
+    """Applies the persisted query-time parameters (nprobe / efSearch) to a loaded index."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(config["nprobe"], ivf.nlist)
+    if isinstance(base_index(index), faiss.IndexHNSW):
+        base_index(index).hnsw.efSearch = config["ef_search"]
+
+def make_search_params(index: faiss.Index, selector, selectivity: float = 1.0) -> faiss.SearchParameters:
+    """
+    Wraps an ID selector in the search-parameter type the index expects.
+    `selectivity` is the share of the index the selector lets through; on
+    IVF and HNSW the search effort (nprobe, efSearch) is scaled up by its
+    inverse, since most of the candidates they visit are filtered out.
+    """
+    boost = 1.0 / max(selectivity, 1e-6)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=min(ivf.nlist, math.ceil(ivf.nprobe * boost)))
+    if isinstance(base_index(index), faiss.IndexHNSW):
+        ef_search = base_index(index).hnsw.efSearch
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=max(ef_search, min(MAX_FILTERED_EF_SEARCH, math.ceil(ef_search * boost))))
+    return faiss.SearchParameters(sel=selector)
+
+def read_index(path: str, config: dict) -> faiss.Index:
+    """
+    Reads an index for serving. With `mmap` enabled the vector codes stay in the
+    OS page cache, shared by every worker process, instead of being copied
+    into each process's private memory.
+    """
+    if config.get("mmap", True) and MMAP_READ_FLAGS is not None:
+        index = faiss.read_index(path, MMAP_READ_FLAGS)
+    else:
+        index = faiss.read_index(path)
+    apply_search_params(index, config)
+    return index
+
+def describe_index(index: faiss.Index) -> str:
+    name = type(base_index(index)).__name__
+    if isinstance(index, faiss.IndexIDMap):
+        name = f"IDMap2({name})"
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return f"{name}(nlist={ivf.nlist}, nprobe={ivf.nprobe})"
+    if isinstance(base_index(index), faiss.IndexHNSW):
+        return f"{name}(efSearch={base_index(index).hnsw.efSearch})"
+    return name
+
+def get_vector_ids(index: faiss.Index) -> np.ndarray:
+    """Vector IDs stored in the index, in storage order (row positions unless it has an ID map)."""
+    if isinstance(index, faiss.IndexIDMap):
+        return faiss.vector_to_array(index.id_map).astype("int64")
+    return np.arange(index.ntotal, dtype="int64")
+
+def next_vector_id(index: faiss.Index) -> int:
+    """The ID the next appended vector gets; IDs are never reused."""
+    vector_ids = get_vector_ids(index)
+    return int(vector_ids.max()) + 1 if len(vector_ids) else 0
+
+def add_vectors(index: faiss.Index, vectors: np.ndarray) -> np.ndarray:
+    """Appends vectors under consecutive new IDs and returns those IDs."""
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    first_vector_id = next_vector_id(index)
+    vector_ids = np.arange(first_vector_id, first_vector_id + len(vectors), dtype="int64")
+    if isinstance(index, faiss.IndexIDMap):
+        index.add_with_ids(vectors, vector_ids)
+    else:
+        index.add(vectors)
+    return vector_ids
+
+def get_all_vectors(index: faiss.Index) -> np.ndarray:
+    """Reads back every stored vector in storage order, matching `get_vector_ids` (lossy for PQ indexes)."""
+    if index.ntotal == 0:
+        return np.empty((0, index.d), dtype="float32")
+    return base_index(index).reconstruct_n(0, index.ntotal)
+
+def is_full_precision(index: faiss.Index) -> bool:
+    """True if the index stores the original float32 vectors (reconstruction is exact)."""
+    return isinstance(base_index(index), (faiss.IndexFlat, faiss.IndexHNSWFlat, faiss.IndexIVFFlat))
+
+def convert_index(index: faiss.Index, config: dict, keep_ids: np.ndarray | None = None) -> faiss.Index:
+    """
+    Rebuilds `index` as the configured type, keeping vector IDs. With
+    `keep_ids`, every other vector is dropped (compaction after deletions).
+    """
+    if not is_full_precision(index):
+        print("WARNING: Rebuilding from a compressed index uses its lossy reconstructed vectors.")
+    vectors = get_all_vectors(index)
+    vector_ids = get_vector_ids(index)
+    if keep_ids is not None:
+        keep = np.isin(vector_ids, keep_ids)
+        vectors, vector_ids = vectors[keep], vector_ids[keep]
+    if isinstance(index, faiss.IndexIDMap) or keep_ids is not None:
+        return build_index(vectors, config, ids=vector_ids)
+    return build_index(vectors, config)
+
+def write_index_atomic(index: faiss.Index, path: str):
+    """
+    Writes the index to a temporary file and renames it into place. Processes
+    that memory-mapped the previous file keep reading it instead of seeing
+    it truncated.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    faiss.write_index(index, path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+
+def rebuild_index(config: dict, vector_store_dir: str = VECTOR_STORE_DIR):
+    """Rebuilds the on-disk index with `config` and persists the config alongside it."""
+    index_path = os.path.join(vector_store_dir, "index.faiss")
+    index = faiss.read_index(index_path)
+    print(f"Rebuilding {describe_index(index)} with {index.ntotal} vectors as '{config['type']}' ({config['storage']})...")
+    index = convert_index(index, config)
+    write_index_atomic(index, index_path)
+    save_index_config(config, os.path.join(vector_store_dir, "index_config.json"))
+    # Running API workers reload the rebuilt index (see VectorStoreHolder.get)
+    from .document_db import open_document_db, VECTOR_STORE_VERSION
+    open_document_db(vector_store_dir).bump_version(VECTOR_STORE_VERSION)
+    print(f"Saved {describe_index(index)} to {vector_store_dir}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Rebuild the FAISS index with a different index type or storage mode.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    rebuild = subparsers.add_parser("rebuild", help="Rebuild data/vector_store/index.faiss")
+    rebuild.add_argument("--type", choices=INDEX_TYPES)
+    rebuild.add_argument("--storage", choices=list(STORAGE_MODES))
+    rebuild.add_argument("--nlist", type=int)
+    rebuild.add_argument("--nprobe", type=int)
+    rebuild.add_argument("--pq-m", dest="pq_m", type=int)
+    rebuild.add_argument("--pq-nbits", dest="pq_nbits", type=int)
+    rebuild.add_argument("--hnsw-m", dest="hnsw_m", type=int)
+    rebuild.add_argument("--ef-construction", dest="ef_construction", type=int)
+    rebuild.add_argument("--ef-search", dest="ef_search", type=int)
+    convert = subparsers.add_parser("convert", help="Convert the existing index to another storage mode, keeping its type")
+    convert.add_argument("--storage", choices=list(STORAGE_MODES), required=True)
+    convert.add_argument("--no-mmap", dest="mmap", action="store_false", default=None)
+    args = parser.parse_args()
+
+    index_config = load_index_config()
+    index_config.update({key: value for key, value in vars(args).items() if key != "command" and value is not None})
+    rebuild_index(index_config)
@@ -1,77 +1,126 @@
 import os
-import json
-import csv
 import re # For regular expressions
+import hashlib
+import time
+import queue
+import argparse
+import fcntl
+import threading
+import multiprocessing
+from contextlib import contextmanager
+from itertools import islice
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
 from dateutil.parser import parse as parse_date # For flexible date parsing
 from dotenv import load_dotenv
-from langchain_community.document_loaders import PyMuPDFLoader
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain.docstore.document import Document
-# Import FAISS, which was previously missing
-from langchain_community.vectorstores import FAISS
-# Import spaCy for sentence splitting
-import spacy
+from langchain_core.documents import Document
+import numpy as np
+import faiss
 from langchain_core.output_parsers import JsonOutputParser, StrOutputParser
 from langchain_core.prompts import PromptTemplate
+from .vector_store import vector_store_holder
+from .index_factory import load_index_config, read_index, build_index, write_index_atomic, is_full_precision, add_vectors, next_vector_id, get_vector_ids, convert_index
+from .embedding_cache import CachedChunkEmbeddings, LazyEmbeddings
+from .chunk_store import open_chunk_store
+from .page_cache import get_page_cache
+from .document_db import get_document_db, METADATA_TABLE, PROCESSED_FILES_TABLE, VECTOR_STORE_VERSION
+from .llm_governor import RateLimitGovernor, BackgroundEventLoop, estimate_tokens
+from .heatmap import MAPPING_CSV_PATH, BUSINESS_DIVISIONS, MappingMatrix, load_mapping_matrix, build_heatmap, heatmap_tags, heatmap_regions, rescore_metadata
 
 load_dotenv()
 
+# spaCy, PyMuPDF and the OpenAI SDK are imported on first use, so importing this
+# module (e.g. from the API server) stays cheap.
+
 # --- spaCy Model Loading ---
+# Sentence boundaries come only from the rule-based sentencizer (the parser was
+# always disabled), so the chunker needs just the tokenizer and that one pipe.
+SPACY_UNUSED_PIPES = ["tok2vec", "tagger", "parser", "senter", "attribute_ruler", "lemmatizer", "ner"]
+# Pages per spaCy batch; n_process stays 1 inside the ingestion worker processes
+CHUNKER_BATCH_SIZE = 64
+
 def load_spacy_model():
-    """Loads the spaCy model and adds the sentencizer pipe."""
+    """Loads the en_core_web_sm tokenizer with a sentencizer-only pipeline."""
+    import spacy
     try:
-        nlp = spacy.load("en_core_web_sm", disable=["ner", "parser"])
+        nlp = spacy.load("en_core_web_sm", exclude=SPACY_UNUSED_PIPES)
         nlp.add_pipe("sentencizer")
         return nlp
     except OSError:
         print("spaCy 'en_core_web_sm' model not found. Please run 'python -m spacy download en_core_web_sm'")
         return None
 
-NLP = load_spacy_model()
+NLP = None
+_nlp_loaded = False
+
+def get_nlp():
+    """Returns the sentence-splitting pipeline, loading it on first use (None if the model is missing)."""
+    global NLP, _nlp_loaded
+    if not _nlp_loaded:
+        if NLP is None:
+            NLP = load_spacy_model()
+        _nlp_loaded = True
+    return NLP
 
 # --- Constants ---
 PDF_SOURCE_DIR = "data/pdfs_to_process"
 VECTOR_STORE_DIR = "data/vector_store"
-PROCESSED_FILES_LOG = os.path.join(VECTOR_STORE_DIR, "processed_files.json")
 FAISS_INDEX_FILE = os.path.join(VECTOR_STORE_DIR, "index.faiss")
-LLM = ChatOpenAI(model="gpt-4-turbo", temperature=0, stream=False)
-EMBEDDINGS = OpenAIEmbeddings(model="text-embedding-3-small", chunk_size=500)
+LLM_MODEL = "gpt-4-turbo"
+EMBEDDING_MODEL = "text-embedding-3-small"
 
-MAPPING_CSV_PATH = "./data/mapping.csv"
-BUSINESS_DIVISIONS = ["AMO", "COO Ops Americas", "COO Ops S&I", "GOTO Operations & COO", "IB Operations (BA)", "P&C Operations", "Treasury"]
-
-# --- NEW METADATA DB CONSTANT ---
-METADATA_DB_PATH = os.path.join(VECTOR_STORE_DIR, "metadata_db.json")
-
-def load_mapping_data():
-    with open(MAPPING_CSV_PATH, mode='r', encoding='utf-8') as infile:
-        return [row for row in csv.DictReader(infile)]
+@lru_cache(maxsize=None)
+def get_llm():
+    """The chat model for metadata analysis, created on first use."""
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(model=LLM_MODEL, temperature=0, stream=False)
 
-# --- NEW: AI function to perform one-time analysis during ingestion ---
+def _openai_embeddings():
+    from langchain_openai import OpenAIEmbeddings
+    return OpenAIEmbeddings(model=EMBEDDING_MODEL, chunk_size=500)
 
-def analyze_document_for_heatmap(full_doc_text: str, filename: str) -> dict:
+@lru_cache(maxsize=None)
+def get_chunk_embeddings() -> CachedChunkEmbeddings:
     """
-    Performs a robust, two-step analysis on a document to extract metadata.
-    This is designed to be efficient and avoid API rate limits.
+    The chunk embeddings, cached by content hash so re-ingestion only embeds
+    changed text. Created on first use: importing this module (also done by
+    every parse worker) opens no embedding_cache.db connection.
     """
-    print(f"  - Analyzing document for metadata: {filename}")
+    return CachedChunkEmbeddings(LazyEmbeddings(_openai_embeddings, EMBEDDING_MODEL))
 
-    # --- Step 1: Create a concise summary to reduce token count ---
-    summary_prompt = PromptTemplate.from_template(
-        "Create a concise, one-paragraph summary of the following regulatory document text. Focus on the main purpose, scope, and key topics mentioned.\n\nTEXT: {context}"
-    )
-    summary_chain = summary_prompt | LLM | StrOutputParser()
-    # Use the first 8000 characters as a representative sample for the summary
-    document_summary = summary_chain.invoke({"context": full_doc_text[:8000]})
+# Ingestion, vacuum and rescoring rewrite the store; only one may run at a
+# time, in this process (INGESTION_LOCK) and across processes such as other
+# API workers or the CLI (a flock on INGESTION_LOCK_FILE), see ingestion_lock()
+INGESTION_LOCK = threading.Lock()
+INGESTION_LOCK_FILE = os.path.join(VECTOR_STORE_DIR, "ingestion.lock")
+# Vacuum automatically once dead vectors make up this share of the index
+AUTO_VACUUM_DEAD_FRACTION = 0.25
+# Worker processes that parse, date and chunk PDFs (1 = parse in-process)
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", min(8, os.cpu_count() or 1)))
+# Start method of the parse worker processes (see iter_parsed_pdfs)
+PARSE_START_METHOD = "spawn"
+# Streaming pipeline bounds: files parsed ahead per worker, chunks per
+# embeddings request / index append, and batches buffered between stages
+PARSE_AHEAD_PER_WORKER = 2
+EMBED_BATCH_SIZE = 256
+PIPELINE_QUEUE_SIZE = 4
+# Read size for streaming content hashes
+HASH_BLOCK_SIZE = 1024 * 1024
+# Fully embedded files are committed (index, chunk rows, logs) at most this often
+CHECKPOINT_INTERVAL_SECONDS = 30
 
-    # --- Step 2: Use the summary to perform the detailed extraction ---
-    mapping_data = load_mapping_data()
-    # Provide only function names to the LLM to save tokens
-    functions_for_prompt = ", ".join([row['Lifecycle'] for row in mapping_data])
-    
-    extraction_prompt = PromptTemplate(
-        template="""You are a data tagging specialist. Based on the DOCUMENT SUMMARY, perform three tasks:
+def load_mapping_data():
+    # Parsed and compiled once, then reused until mapping.csv changes
+    return load_mapping_matrix(MAPPING_CSV_PATH).rows
+
+# --- NEW: AI function to perform one-time analysis during ingestion ---
+
+SUMMARY_PROMPT = PromptTemplate.from_template(
+    "Create a concise, one-paragraph summary of the following regulatory document text. Focus on the main purpose, scope, and key topics mentioned.\n\nTEXT: {context}"
+)
+EXTRACTION_PROMPT = PromptTemplate(
+    template="""You are a data tagging specialist. Based on the DOCUMENT SUMMARY, perform three tasks:
         1.  From the provided LIST OF BUSINESS LIFECYLCES, identify ALL lifecycles that are relevant.
         2.  'author': The name of the regulatory body or organization that published the document (e.g., "European Banking Federation", "SwissFinanceCouncil"). Extract the single primary 'author' or regulatory body.
         3.  'regions': A list of countries or regions this regulation applies to (e.g., ["EU", "US", "Switzerland"]). The name of the author or the regulatory body might strongly indicate the relevant region, e.g. if the "author" is "SwissFinanceCouncil", then the applicable region is "Switzerland"
@@ -83,20 +132,26 @@ def analyze_document_for_heatmap(full_doc_text: str, filename: str) -> dict:
         {all_functions}
 
         Respond with ONLY a single, valid JSON object with two keys: "relevant_lifecycles" (a list of strings) and "author" (a string).""",
-        input_variables=["summary", "all_functions"]
-    )
-    extraction_chain = extraction_prompt | LLM | JsonOutputParser()
-    
-    try:
-        response = extraction_chain.invoke({
-            "summary": document_summary,
-            "all_functions": functions_for_prompt
-        })
-        relevant_lifecycle_names = response.get("relevant_lifecycles", [])
-    except Exception as e:
-        print(f"    - LLM metadata extraction failed: {e}. Using defaults.")
-        response = {"relevant_lifecycles": [], "author": "Unknown", "regions": []}
-        
+    input_variables=["summary", "all_functions"]
+)
+# Use the first 8000 characters as a representative sample for the summary
+SUMMARY_SAMPLE_CHARS = 8000
+# Completion allowance added to the prompt size when budgeting tokens
+SUMMARY_COMPLETION_TOKENS = 300
+EXTRACTION_COMPLETION_TOKENS = 500
+
+# Concurrent metadata analysis: files analyzed at once and the LLM budget they share
+ANALYSIS_CONCURRENCY = int(os.getenv("ANALYSIS_CONCURRENCY", 16))
+LLM_GOVERNOR = RateLimitGovernor(
+    requests_per_minute=int(os.getenv("LLM_REQUESTS_PER_MINUTE", 500)),
+    tokens_per_minute=int(os.getenv("LLM_TOKENS_PER_MINUTE", 300000)),
+    max_concurrency=ANALYSIS_CONCURRENCY,
+)
+ANALYSIS_LOOP = BackgroundEventLoop()
+
+
+def build_heatmap_metadata(response: dict, mapping: MappingMatrix) -> dict:
+    """Validates the LLM extraction and derives heatmap scores, tags and regions from it."""
     # --- Step 3: Robustly validate and coerce the LLM's output ---
     author = response.get("author", "Unknown")
     relevant_lifecycle_names = response.get("relevant_lifecycles", [])
@@ -106,38 +161,71 @@ def analyze_document_for_heatmap(full_doc_text: str, filename: str) -> dict:
     if isinstance(relevant_lifecycle_names, str):
         relevant_lifecycle_names = [name.strip() for name in relevant_lifecycle_names.split(',')]
     
-    # --- Step 4: Calculate scores and generate tags in Python (fast and reliable) ---
-    heatmap_scores = {div: 0 for div in BUSINESS_DIVISIONS}
-    relevant_functions_data = [row for row in mapping_data if row['Lifecycle'] in relevant_lifecycle_names]
-    
-    for function_row in relevant_functions_data:
-        for division in BUSINESS_DIVISIONS:
-            try:
-                heatmap_scores[division] += int(function_row.get(division, 0))
-            except (ValueError, TypeError):
-                continue
-    
-    heatmap_data = {}
-    tags = []
-    # regions = [] # We will now derive regions from division names for consistency
-    for division, score in heatmap_scores.items():
-        if score >= 30: level = "High"
-        elif score >= 10: level = "Medium"
-        elif score > 0: level = "Low"
-        else: level = "None"
-        heatmap_data[division] = {"score": score, "level": level}
-        if level != "None":
-            tags.append(division.split(' ')[0]) # e.g., "COO", "P&C"
-            if "Americas" in division: regions.append("Americas")
+    # --- Step 4: Calculate scores and generate tags from the compiled mapping matrix ---
+    heatmap_data = build_heatmap(mapping.score(relevant_lifecycle_names), mapping.divisions)
+    tags = heatmap_tags(heatmap_data) # e.g., "COO", "P&C"
 
     return {
         "author": author,
-        "tags": sorted(list(set(tags))),
-        "regions": sorted(list(set(regions))) if regions else ["Global"],
+        "tags": tags,
+        "regions": heatmap_regions(regions, heatmap_data),
         "heatmapData": heatmap_data,
         "impactedLifecycles": relevant_lifecycle_names
     }
 
+def analyze_document_for_heatmap(full_doc_text: str, filename: str) -> dict:
+    """
+    Performs a robust, two-step analysis on a document to extract metadata.
+    This is designed to be efficient and avoid API rate limits.
+    """
+    print(f"  - Analyzing document for metadata: {filename}")
+
+    # --- Step 1: Create a concise summary to reduce token count ---
+    summary_chain = SUMMARY_PROMPT | get_llm() | StrOutputParser()
+    document_summary = summary_chain.invoke({"context": full_doc_text[:SUMMARY_SAMPLE_CHARS]})
+
+    # --- Step 2: Use the summary to perform the detailed extraction ---
+    mapping = load_mapping_matrix(MAPPING_CSV_PATH)
+    # Provide only function names to the LLM to save tokens
+    functions_for_prompt = ", ".join([row['Lifecycle'] for row in mapping.rows])
+    extraction_chain = EXTRACTION_PROMPT | get_llm() | JsonOutputParser()
+    
+    try:
+        response = extraction_chain.invoke({
+            "summary": document_summary,
+            "all_functions": functions_for_prompt
+        })
+    except Exception as e:
+        print(f"    - LLM metadata extraction failed: {e}. Using defaults.")
+        response = {"relevant_lifecycles": [], "author": "Unknown", "regions": []}
+    return build_heatmap_metadata(response, mapping)
+
+async def analyze_document_for_heatmap_async(full_doc_text: str, filename: str) -> dict:
+    """
+    Async version of `analyze_document_for_heatmap` for the concurrent analysis
+    stage: both LLM calls go through LLM_GOVERNOR's request/token budget.
+    """
+    print(f"  - Analyzing document for metadata: {filename}")
+    context = full_doc_text[:SUMMARY_SAMPLE_CHARS]
+    summary_chain = SUMMARY_PROMPT | get_llm() | StrOutputParser()
+    document_summary = await LLM_GOVERNOR.run(
+        lambda: summary_chain.ainvoke({"context": context}),
+        estimate_tokens(SUMMARY_PROMPT.template + context, SUMMARY_COMPLETION_TOKENS)
+    )
+
+    mapping = load_mapping_matrix(MAPPING_CSV_PATH)
+    functions_for_prompt = ", ".join([row['Lifecycle'] for row in mapping.rows])
+    extraction_chain = EXTRACTION_PROMPT | get_llm() | JsonOutputParser()
+    try:
+        response = await LLM_GOVERNOR.run(
+            lambda: extraction_chain.ainvoke({"summary": document_summary, "all_functions": functions_for_prompt}),
+            estimate_tokens(EXTRACTION_PROMPT.template + document_summary + functions_for_prompt, EXTRACTION_COMPLETION_TOKENS)
+        )
+    except Exception as e:
+        print(f"    - LLM metadata extraction failed for {filename}: {e}. Using defaults.")
+        response = {"relevant_lifecycles": [], "author": "Unknown", "regions": []}
+    return build_heatmap_metadata(response, mapping)
+
 
 # def analyze_document_for_heatmap(docs_context: str) -> dict:
 #     """
@@ -210,20 +298,21 @@ def analyze_document_for_heatmap(full_doc_text: str, filename: str) -> dict:
 
 
 
-def sentence_chunker(docs: list[Document], max_chunk_chars: int = 1500) -> list[Document]:
+def sentence_chunker(docs: list[Document], max_chunk_chars: int = 1500,
+                     batch_size: int = CHUNKER_BATCH_SIZE, n_process: int = 1) -> list[Document]:
     """
     A stable, custom semantic chunker using spaCy.
+    Pages are sentence-split in batches with `nlp.pipe`.
     """
-    if not NLP:
+    nlp = get_nlp()
+    if not nlp:
         raise ImportError("spaCy model could not be loaded. Please ensure it's installed and loaded correctly.")
 
     all_chunks = []
     
-    for doc in docs:
-        if not doc.page_content:
-            continue
-
-        spacy_doc = NLP(doc.page_content)
+    docs = [doc for doc in docs if doc.page_content]
+    spacy_docs = nlp.pipe((doc.page_content for doc in docs), batch_size=batch_size, n_process=n_process)
+    for doc, spacy_doc in zip(docs, spacy_docs):
         sentences = [sent.text.strip() for sent in spacy_doc.sents]
         
         current_chunk = ""
@@ -272,14 +361,64 @@ def extract_publication_date(text: str) -> str | None:
     return None
 
 def load_processed_files_log():
-    if os.path.exists(PROCESSED_FILES_LOG):
-        with open(PROCESSED_FILES_LOG, 'r') as f:
-            return json.load(f)
-    return {}
+    return get_document_db().get_all(PROCESSED_FILES_TABLE)
+
+def hash_file(file_path: str) -> str:
+    """SHA-256 of the file contents, read in blocks so large PDFs never sit in memory."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def detect_changes(processed_log: dict, all_pdf_files: list[str]):
+    """
+    Compares the PDFs on disk with the processed-files log, which maps each
+    file to its size, mtime and content hash. Unchanged size and mtime cost
+    only a stat; otherwise the content hash decides, so copies, restores and
+    identical re-uploads are not re-ingested. Updates stat-only changes in
+    `processed_log` and returns (files_to_process, renamed, removed_files,
+    fingerprints), where files_to_process holds (name, path, mtime, sha256)
+    and `renamed` maps new names to the logged file with the same content.
+    """
+    files_to_process = []
+    fingerprints = {}
+    changed = []
+    for pdf_file in all_pdf_files:
+        file_path = os.path.join(PDF_SOURCE_DIR, pdf_file)
+        stat = os.stat(file_path)
+        entry = processed_log.get(pdf_file)
+        if isinstance(entry, dict) and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            print(f"Skipping unchanged file: {pdf_file}")
+            continue
+        fingerprint = {"size": stat.st_size, "mtime": stat.st_mtime, "sha256": hash_file(file_path)}
+        # Older logs stored only the mtime
+        unchanged = fingerprint["sha256"] == entry.get("sha256") if isinstance(entry, dict) else entry is not None and stat.st_mtime <= entry
+        if unchanged:
+            print(f"Skipping unchanged file: {pdf_file}")
+            processed_log[pdf_file] = fingerprint
+            continue
+        fingerprints[pdf_file] = fingerprint
+        changed.append((pdf_file, file_path, stat.st_mtime))
+
+    removed_files = [pdf_file for pdf_file in processed_log if pdf_file not in all_pdf_files]
+    removed_by_hash = {
+        processed_log[pdf_file]["sha256"]: pdf_file
+        for pdf_file in removed_files if isinstance(processed_log[pdf_file], dict)
+    }
+    renamed = {}
+    for pdf_file, file_path, mod_time in changed:
+        old_name = removed_by_hash.pop(fingerprints[pdf_file]["sha256"], None)
+        if old_name is not None and pdf_file not in processed_log:
+            renamed[pdf_file] = old_name
+            removed_files.remove(old_name)
+        else:
+            files_to_process.append((pdf_file, file_path, mod_time, fingerprints[pdf_file]["sha256"]))
+    return files_to_process, renamed, removed_files, fingerprints
 
 def save_processed_files_log(log_data):
-    with open(PROCESSED_FILES_LOG, 'w') as f:
-        json.dump(log_data, f, indent=2)
+    """Replaces the whole log; ingestion itself writes only the rows that changed."""
+    get_document_db().replace_all(PROCESSED_FILES_TABLE, log_data)
 
 # --- NEW FUNCTION: LLM-based Metadata Extraction ---
 def extract_metadata_with_llm(text_chunk: str, filename: str) -> dict:
@@ -296,7 +435,7 @@ def extract_metadata_with_llm(text_chunk: str, filename: str) -> dict:
         Respond with ONLY a single, valid JSON object with the keys "author", "tags", and "regions".""",
         input_variables=["context"]
     )
-    chain = prompt | LLM | JsonOutputParser()
+    chain = prompt | get_llm() | JsonOutputParser()
     try:
         return chain.invoke({"context": text_chunk})
     except Exception as e:
@@ -304,16 +443,227 @@ def extract_metadata_with_llm(text_chunk: str, filename: str) -> dict:
         return {"author": "Unknown", "tags": [], "regions": []}
 
 # --- NEW FUNCTIONS FOR METADATA DB ---
+# Document metadata lives in documents.db, one row per document
 def load_metadata_db():
-    if os.path.exists(METADATA_DB_PATH):
-        with open(METADATA_DB_PATH, 'r') as f: return json.load(f)
-    return {}
+    """A fresh, mutable copy of every document's metadata (for writers)."""
+    return get_document_db().get_all(METADATA_TABLE)
+
+def cached_metadata_db() -> dict:
+    """Every document's metadata from the in-process cache; shared, so read-only."""
+    return get_document_db().cached(METADATA_TABLE).get_all()
 
 def save_metadata_db(data):
-    # This function is now correctly called at the end of the main script
-    with open(METADATA_DB_PATH, 'w') as f: json.dump(data, f, indent=2)
+    """Replaces the whole metadata DB; prefer save_document_metadata for single documents."""
+    get_document_db().replace_all(METADATA_TABLE, data)
+
+def load_document_metadata(document_name: str) -> dict | None:
+    return get_document_db().cached(METADATA_TABLE).get(document_name)
+
+def save_document_metadata(document_name: str, metadata: dict):
+    get_document_db().put(METADATA_TABLE, document_name, metadata)
+
+def write_rows(table: str, updates: dict):
+    """Upserts the given rows of a documents.db table; a None value deletes the row."""
+    db = get_document_db()
+    with db.transaction():
+        db.delete(table, [key for key, value in updates.items() if value is None])
+        db.put_many(table, {key: value for key, value in updates.items() if value is not None})
+
+def load_pdf_pages(file_path: str) -> list[Document]:
+    from langchain_community.document_loaders import PyMuPDFLoader
+    return PyMuPDFLoader(file_path).load()
+
+def load_cached_pages(file_path: str, content_hash: str) -> list[Document]:
+    """A PDF's pages from the page cache, extracting and caching them on a miss."""
+    page_cache = get_page_cache()
+    if page_cache.page_count(content_hash) is None:
+        docs = load_pdf_pages(file_path)
+        page_cache.put_pages(content_hash, docs)
+        return docs
+    docs = list(page_cache.iter_pages(content_hash))
+    # The cached copy may have been extracted under another name
+    for doc in docs:
+        for key in ('source', 'file_path'):
+            if key in doc.metadata:
+                doc.metadata[key] = file_path
+    return docs
 
-def process_pdfs_incrementally():
+def file_content_hash(pdf_file: str) -> str:
+    """The PDF's SHA-256, taken from the processed-files log while the file is unchanged on disk."""
+    stat = os.stat(os.path.join(PDF_SOURCE_DIR, pdf_file))
+    entry = get_document_db().get(PROCESSED_FILES_TABLE, pdf_file)
+    if isinstance(entry, dict) and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+        return entry["sha256"]
+    return hash_file(os.path.join(PDF_SOURCE_DIR, pdf_file))
+
+def read_document_text(pdf_file: str, max_chars: int | None = None, start_page: int = 0, stop_page: int | None = None) -> str:
+    """
+    Text of a PDF in data/pdfs_to_process (or of a page range), read lazily
+    from the page cache; the PDF is only opened if this version isn't cached.
+    """
+    content_hash = file_content_hash(pdf_file)
+    page_cache = get_page_cache()
+    if page_cache.page_count(content_hash) is None:
+        page_cache.put_pages(content_hash, load_pdf_pages(os.path.join(PDF_SOURCE_DIR, pdf_file)))
+    return page_cache.get_text(content_hash, start_page, stop_page, max_chars=max_chars)
+
+def parse_pdf(pdf_file: str, file_path: str, mod_time: float, content_hash: str) -> dict:
+    """
+    Loads one PDF (from the page cache when this content was extracted
+    before), extracts its publication date and splits it into chunks.
+    Runs in a worker process, so it only touches its arguments and module constants.
+    """
+    start_time = time.perf_counter()
+    docs = load_cached_pages(file_path, content_hash)
+    publication_date_str = None
+    if docs:
+        publication_date_str = extract_publication_date(docs[0].page_content)
+        if not publication_date_str and len(docs) > 1:
+            publication_date_str = extract_publication_date(docs[-1].page_content)
+    date_from_text = publication_date_str is not None
+    if not publication_date_str:
+        publication_date_str = datetime.fromtimestamp(mod_time).strftime('%Y-%m-%d')
+
+    for doc in docs:
+        doc.metadata['source_file'] = pdf_file
+        doc.metadata['publication_date'] = publication_date_str
+    return {
+        "pdf_file": pdf_file,
+        "mod_time": mod_time,
+        "content_hash": content_hash,
+        "publication_date": publication_date_str,
+        "date_from_text": date_from_text,
+        "pages": len(docs),
+        "chunks": sentence_chunker(docs),
+        # Parse time alone, without waiting for the embedding stage
+        "parse_seconds": time.perf_counter() - start_time,
+    }
+
+def iter_parsed_pdfs(files_to_process: list[tuple], workers: int = INGESTION_WORKERS):
+    """
+    Yields `parse_pdf` results as soon as each file is done. With more than one
+    worker the files are parsed in a process pool, in completion order, with
+    at most PARSE_AHEAD_PER_WORKER files per worker submitted ahead.
+    """
+    if workers <= 1 or len(files_to_process) <= 1:
+        for file_info in files_to_process:
+            yield parse_pdf(*file_info)
+        return
+    workers = min(workers, len(files_to_process))
+    remaining = iter(files_to_process)
+    pending = set()
+    # Spawned rather than forked: in the API process other threads (the uvicorn
+    # pool, the LLM event loop, the write-behind flusher) may hold locks that a
+    # forked child would inherit locked. Each worker loads spaCy once at start.
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(PARSE_START_METHOD),
+                             initializer=get_nlp) as pool:
+        while True:
+            for file_info in islice(remaining, workers * PARSE_AHEAD_PER_WORKER - len(pending)):
+                pending.add(pool.submit(parse_pdf, *file_info))
+            if not pending:
+                return
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+class _StageError:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+_STAGE_DONE = object()
+
+def run_stage(items, maxsize: int = PIPELINE_QUEUE_SIZE):
+    """
+    Runs the generator `items` in a background thread and yields its results
+    through a queue of at most `maxsize` entries. The stage works ahead of its
+    consumer, but never more than `maxsize` items. Errors are re-raised here.
+    """
+    buffer = queue.Queue(maxsize=maxsize)
+    stopped = threading.Event()
+
+    def put(item) -> bool:
+        while not stopped.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put(item):
+                    return
+        except BaseException as e:
+            put(_StageError(e))
+            return
+        put(_STAGE_DONE)
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is _STAGE_DONE:
+                return
+            if isinstance(item, _StageError):
+                raise item.error
+            yield item
+    finally:
+        # Unblocks the producer if the consumer stops early
+        stopped.set()
+
+def iter_batches(items, batch_size: int):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def iter_embedded_batches(chunk_batches, embeddings):
+    """Embeds each batch of chunks; yields (chunks, float32 vectors)."""
+    for chunks in chunk_batches:
+        vectors = np.array(embeddings.embed_documents([d.page_content for d in chunks]), dtype="float32")
+        yield chunks, vectors
+
+class IngestionBusyError(RuntimeError):
+    """Raised by a non-blocking ingestion_lock() while another run holds it."""
+
+@contextmanager
+def ingestion_lock(blocking: bool = True):
+    """
+    Holds the store for one writer across threads and processes. With
+    blocking=False, raises IngestionBusyError instead of waiting.
+    """
+    if not INGESTION_LOCK.acquire(blocking=blocking):
+        raise IngestionBusyError("Another ingestion, vacuum or rescore is running.")
+    try:
+        os.makedirs(VECTOR_STORE_DIR, exist_ok=True)
+        with open(INGESTION_LOCK_FILE, "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise IngestionBusyError("Another process is ingesting, vacuuming or rescoring.") from None
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    finally:
+        INGESTION_LOCK.release()
+
+def process_pdfs_incrementally(workers: int = INGESTION_WORKERS, progress=None):
+    """
+    Ingests new, modified, renamed and removed PDFs. `progress`, if given, is
+    called with a dict of counters (files parsed/committed, chunks embedded).
+    """
+    with ingestion_lock():
+        return _process_pdfs_incrementally(workers, progress)
+
+def _process_pdfs_incrementally(workers: int, progress):
     print("Starting incremental PDF ingestion process...")
     if not os.path.exists(PDF_SOURCE_DIR):
         print(f"Source directory not found: {PDF_SOURCE_DIR}")
@@ -321,90 +671,305 @@ def process_pdfs_incrementally():
 
     processed_log = load_processed_files_log()
     metadata_db = load_metadata_db()
-    vector_store = None
-    
-    if os.path.exists(FAISS_INDEX_FILE):
-        print("Loading existing vector store...")
-        vector_store = FAISS.load_local(VECTOR_STORE_DIR, EMBEDDINGS, allow_dangerous_deserialization=True)
-    else:
-        print("No existing FAISS index found. A new one will be created.")
+    db = get_document_db()
 
-    files_to_process = []
     all_pdf_files = [f for f in os.listdir(PDF_SOURCE_DIR) if f.endswith(".pdf")]
-    for pdf_file in all_pdf_files:
-        file_path = os.path.join(PDF_SOURCE_DIR, pdf_file)
-        mod_time = os.path.getmtime(file_path)
-        if pdf_file not in processed_log or processed_log[pdf_file] < mod_time:
-            files_to_process.append((pdf_file, file_path, mod_time))
-        else:
-            print(f"Skipping unchanged file: {pdf_file}")
+    logged = dict(processed_log)
+    files_to_process, renamed, removed_files, fingerprints = detect_changes(processed_log, all_pdf_files)
+    # Rows written at the next commit (None deletes); only changed documents are written
+    log_updates = {pdf_file: entry for pdf_file, entry in processed_log.items() if logged.get(pdf_file) != entry}
+    metadata_updates = {}
+    for pdf_file in removed_files:
+        print(f"Removing deleted file: {pdf_file}")
+        del processed_log[pdf_file]
+        metadata_db.pop(pdf_file, None)
 
-    if not files_to_process:
+    if not files_to_process and not removed_files and not renamed:
         print("No new or modified files to process. Ingestion complete.")
+        write_rows(PROCESSED_FILES_TABLE, log_updates)
         return list(processed_log.keys())
 
-    new_docs = []
-    for pdf_file, file_path, mod_time in files_to_process:
-        print(f"Loading: {pdf_file}")
-        loader = PyMuPDFLoader(file_path)
-        docs = loader.load()
-        full_doc_text = "\n".join([d.page_content for d in docs])
+    if not os.path.exists(VECTOR_STORE_DIR): os.makedirs(VECTOR_STORE_DIR)
+    chunk_store = open_chunk_store(VECTOR_STORE_DIR)
+    embeddings = get_chunk_embeddings()
+    index_config = load_index_config()
+
+    # Renamed files keep their chunks, vectors and metadata under the new name
+    renamed_chunks = 0
+    for pdf_file, old_name in renamed.items():
+        print(f"Renamed file: {old_name} -> {pdf_file}")
+        renamed_chunks += chunk_store.rename_file(old_name, pdf_file)
+        processed_log[pdf_file] = log_updates[pdf_file] = fingerprints[pdf_file]
+        del processed_log[old_name]
+        log_updates[old_name] = None
+        if old_name in metadata_db:
+            metadata_db[pdf_file] = metadata_updates[pdf_file] = metadata_db.pop(old_name)
+            metadata_updates[old_name] = None
+
+    # A new copy of an already analyzed document reuses its metadata instead of
+    # a new LLM analysis (its chunk embeddings come from the embedding cache)
+    analyzed_by_hash = {
+        entry["sha256"]: pdf_file for pdf_file, entry in processed_log.items()
+        if isinstance(entry, dict) and pdf_file in metadata_db
+    }
+    for pdf_file, _, _, _ in files_to_process:
+        source = analyzed_by_hash.get(fingerprints[pdf_file]["sha256"])
+        if pdf_file not in metadata_db and source is not None:
+            print(f"Reusing the metadata of identical file {source} for {pdf_file}")
+            metadata_db[pdf_file] = dict(metadata_db[source])
+
+    # Chunks of modified and removed files are replaced/dropped, never duplicated.
+    # This also covers files whose chunks a crashed run committed before logging them.
+    stored_files = chunk_store.get_publication_dates().keys()
+    stale_files = set(removed_files) | {pdf_file for pdf_file, _, _, _ in files_to_process if pdf_file in stored_files}
+
+    if os.path.exists(FAISS_INDEX_FILE):
+        print("Loading existing vector store...")
+        # A private, writable copy; API readers keep using their memory-mapped snapshot
+        index = faiss.read_index(FAISS_INDEX_FILE)
+        if is_full_precision(index):
+            seeded = embeddings.seed_from_index(index, chunk_store)
+            if seeded:
+                print(f"Seeded the chunk embedding cache with {seeded} existing vectors.")
+    else:
+        print("No existing FAISS index found. A new one will be created.")
+        index = None
+    new_store = index is None
 
-        if pdf_file not in metadata_db:
+    # Chunks are appended in page order under new, consecutive vector IDs. Rows
+    # past the saved index are leftovers of an interrupted run and are overwritten.
+    first_vector_id = next_vector_id(index) if index is not None else 0
+    chunk_store.delete_from(first_vector_id)
 
-            print(f"  - Performing quantitative analysis for {pdf_file}...")
+    totals = {"pages": 0, "chunks": 0, "unsaved_chunks": 0, "parse_seconds": 0.0}
+    progress_state = {"files_total": len(files_to_process), "files_parsed": 0, "files_committed": 0, "chunks_embedded": 0}
+
+    def report(**counters):
+        progress_state.update(counters)
+        if progress is not None:
+            progress(dict(progress_state))
+    # Shared with the parse stage's thread: metadata/log dicts and the number of
+    # chunks of each parsed file that are not in the index yet
+    state_lock = threading.Lock()
+    pending_chunks: dict[str, int] = {}
+    # File -> future of its LLM metadata analysis; analyses of many files run
+    # concurrently on ANALYSIS_LOOP while parsing and embedding continue
+    analyses: dict = {}
+    failed_analyses: set[str] = set()
+
+    async def analyze_and_store(pdf_file: str, full_doc_text: str, publication_date_str: str):
+        try:
             # This one-time analysis generates all the required metadata
-            quantitative_metadata = analyze_document_for_heatmap(full_doc_text, pdf_file)
+            quantitative_metadata = await analyze_document_for_heatmap_async(full_doc_text, pdf_file)
+        except Exception as e:
+            print(f"  - Metadata analysis failed for {pdf_file}: {e}. It will be retried on the next run.")
+            with state_lock:
+                failed_analyses.add(pdf_file)
+            return
+        with state_lock:
+            quantitative_metadata['publication_date'] = publication_date_str
             metadata_db[pdf_file] = quantitative_metadata
+        # The LLM analysis is saved right away, so a crash never pays for it twice
+        save_document_metadata(pdf_file, quantitative_metadata)
 
-            # llm_context = " ".join([d.page_content for d in docs])[:4000]
-            # extracted_meta = extract_metadata_with_llm(llm_context, pdf_file)
-            # metadata_db[pdf_file] = extracted_meta
+    def iter_new_chunks():
+        for parsed in iter_parsed_pdfs(files_to_process, workers):
+            pdf_file = parsed["pdf_file"]
+            print(f"Loaded: {pdf_file} ({parsed['pages']} pages, {len(parsed['chunks'])} chunks)")
 
-        publication_date_str = None
-        if docs:
-            publication_date_str = extract_publication_date(docs[0].page_content)
-            if not publication_date_str and len(docs) > 1:
-                publication_date_str = extract_publication_date(docs[-1].page_content)
-        
-        if not publication_date_str:
-            publication_date_str = datetime.fromtimestamp(mod_time).strftime('%Y-%m-%d')
-            print(f"  - No publication date found in text. Using file date: {publication_date_str}")
-        else:
-            print(f"  - Extracted publication date: {publication_date_str}")
-        
-        for doc in docs:
-            doc.metadata['source_file'] = pdf_file
-            doc.metadata['publication_date'] = publication_date_str
-        
-        new_docs.extend(docs)
-        processed_log[pdf_file] = mod_time
-        metadata_db[pdf_file]['publication_date'] = publication_date_str
+            publication_date_str = parsed["publication_date"]
+            if not parsed["date_from_text"]:
+                print(f"  - No publication date found in text. Using file date: {publication_date_str}")
+            else:
+                print(f"  - Extracted publication date: {publication_date_str}")
+
+            with state_lock:
+                totals["pages"] += parsed["pages"]
+                totals["parse_seconds"] += parsed["parse_seconds"]
+                if pdf_file not in metadata_db:
+                    print(f"  - Queued quantitative analysis for {pdf_file}...")
+                    # The analysis only reads the opening sample, straight from the page cache
+                    sample = get_page_cache().get_text(parsed["content_hash"], max_chars=SUMMARY_SAMPLE_CHARS)
+                    analyses[pdf_file] = ANALYSIS_LOOP.submit(analyze_and_store(pdf_file, sample, publication_date_str))
+                else:
+                    metadata_db[pdf_file]['publication_date'] = publication_date_str
+                    # Only this document's row; edits made through the API meanwhile are kept
+                    known = metadata_db[pdf_file]
+                    db.update(METADATA_TABLE, pdf_file, lambda meta: {**(meta or known), 'publication_date': publication_date_str})
+                pending_chunks[pdf_file] = len(parsed["chunks"])
+                report(files_parsed=progress_state["files_parsed"] + 1)
+            yield from parsed["chunks"]
+
+    # A new store of a trained type (IVF, SQ) is streamed into a flat index and
+    # only converted and written once all vectors are in
+    defer_index_writes = new_store and (index_config["type"], index_config["storage"]) != ("flat", "float32")
+    snapshot = None
+
+    def commit_files(final: bool = False):
+        """
+        Commits every fully embedded file: writes the index, drops the old
+        chunks of replaced files, then records the files in the processed log.
+        A crash in between only means the files are re-ingested (from the
+        embedding cache) on the next run.
+        """
+        nonlocal index, snapshot
+        if final:
+            wait(list(analyses.values()))
+        with state_lock:
+            # Fully embedded and analyzed; failed analyses stay uncommitted and are redone next run
+            done = [
+                pdf_file for pdf_file, remaining in pending_chunks.items()
+                if remaining == 0 and pdf_file not in failed_analyses
+                and (pdf_file not in analyses or analyses[pdf_file].done())
+            ]
+        if (not done and not final) or (defer_index_writes and not final):
+            return
+        if final and defer_index_writes and index is not None:
+            index = convert_index(index, index_config)
+        if totals["unsaved_chunks"]:
+            write_index_atomic(index, FAISS_INDEX_FILE)
+        replaced = [pdf_file for pdf_file in done if pdf_file in stale_files]
+        if final:
+            replaced += [pdf_file for pdf_file in removed_files]
+        deleted = chunk_store.delete_files(replaced, below_vector_id=first_vector_id)
+        if deleted:
+            print(f"Dropped {deleted} chunks of {len(replaced)} modified or removed files.")
+        with state_lock:
+            for pdf_file in done:
+                del pending_chunks[pdf_file]
+                processed_log[pdf_file] = log_updates[pdf_file] = fingerprints[pdf_file]
+            if final:
+                for pdf_file in removed_files:
+                    log_updates[pdf_file] = metadata_updates[pdf_file] = None
+            with db.transaction():
+                write_rows(METADATA_TABLE, metadata_updates)
+                write_rows(PROCESSED_FILES_TABLE, log_updates)
+            metadata_updates.clear()
+            log_updates.clear()
+        if (totals["unsaved_chunks"] or deleted or (final and renamed_chunks)) and os.path.exists(FAISS_INDEX_FILE):
+            # Hot-swap the resident store with the committed, memory-mapped file:
+            # in-flight queries keep their old snapshot
+            snapshot = vector_store_holder.publish(
+                read_index(FAISS_INDEX_FILE, index_config), chunk_store, db.bump_version(VECTOR_STORE_VERSION)
+            )
+        totals["unsaved_chunks"] = 0
+        report(files_committed=progress_state["files_committed"] + len(done))
+        if done and not final:
+            print(f"Checkpoint: committed {len(done)} files.")
 
-    if not new_docs:
+    # Streaming pipeline: parse/chunk -> embed in batches -> append to the index.
+    # Each stage runs ahead of the next through a bounded queue, so memory stays
+    # flat however many files are ingested.
+    start_time = time.perf_counter()
+    last_checkpoint = start_time
+    reused_before, computed_before = embeddings.reused, embeddings.computed
+    print(f"Parsing {len(files_to_process)} files with {min(workers, len(files_to_process))} worker(s)...")
+    chunk_batches = run_stage(iter_batches(iter_new_chunks(), EMBED_BATCH_SIZE))
+    try:
+        for chunks, vectors in run_stage(iter_embedded_batches(chunk_batches, embeddings)):
+            if index is None:
+                # Streamed into a flat index; converted at the end if another type is configured
+                index = build_index(np.empty((0, vectors.shape[1]), dtype="float32"), dict(index_config, type="flat", storage="float32"))
+            chunk_store.add_documents(chunks, add_vectors(index, vectors))
+            totals["chunks"] += len(chunks)
+            totals["unsaved_chunks"] += len(chunks)
+            with state_lock:
+                for chunk in chunks:
+                    pending_chunks[chunk.metadata["source_file"]] -= 1
+                report(chunks_embedded=totals["chunks"])
+            if time.perf_counter() - last_checkpoint >= CHECKPOINT_INTERVAL_SECONDS:
+                commit_files()
+                last_checkpoint = time.perf_counter()
+    except BaseException:
+        # Let in-flight analyses finish and save, so the rerun doesn't pay for them twice
+        wait(list(analyses.values()))
+        raise
+
+    elapsed = time.perf_counter() - start_time
+    if files_to_process:
+        print(f"Ingested {totals['pages']} document pages ({totals['chunks']} sentence-aware chunks) in {elapsed:.1f}s end to end ({totals['pages'] / max(elapsed, 1e-9):.1f} pages/sec, including embedding and analysis).")
+        # Parse throughput of one worker; the pool parses up to `workers` times as fast
+        print(f"Parsing took {totals['parse_seconds']:.1f} worker-seconds ({totals['pages'] / max(totals['parse_seconds'], 1e-9):.1f} pages/sec per worker, {min(workers, len(files_to_process))} worker(s)).")
+        # Only chunks whose exact text hasn't been embedded before hit the API
+        print(f"Chunk embeddings: {embeddings.reused - reused_before} reused from cache, {embeddings.computed - computed_before} computed.")
+
+    commit_files(final=True)
+    # Keep cached page text only for file versions that are still current
+    live_hashes = {entry["sha256"] for entry in processed_log.values() if isinstance(entry, dict)}
+    live_hashes.update(fingerprint["sha256"] for fingerprint in fingerprints.values())
+    pruned = get_page_cache().retain(live_hashes)
+    if pruned:
+        print(f"Dropped cached page text of {pruned} outdated file versions.")
+    if snapshot is None:
         print("Completed with no new content to add.")
-        save_metadata_db(metadata_db) # Save metadata even if no new vector docs are chunked
-        save_processed_files_log(processed_log)
         return list(processed_log.keys())
 
-    chunked_docs = sentence_chunker(new_docs)
-    print(f"Split {len(new_docs)} document pages into {len(chunked_docs)} sentence-aware chunks.")
-
-    if vector_store:
-        vector_store.add_documents(chunked_docs)
-    else:
-        vector_store = FAISS.from_documents(chunked_docs, EMBEDDINGS)
-    
-    if not os.path.exists(VECTOR_STORE_DIR): os.makedirs(VECTOR_STORE_DIR)
-    
-    # --- THE CRITICAL FIX: Save all databases at the end ---
-    save_metadata_db(metadata_db)
-    vector_store.save_local(VECTOR_STORE_DIR)
-    save_processed_files_log(processed_log)
-    
     print(f"Vector store and metadata databases updated and saved at {VECTOR_STORE_DIR}")
+    if len(snapshot.dead_ids) > AUTO_VACUUM_DEAD_FRACTION * snapshot.store.index.ntotal:
+        _vacuum_vector_store()
     return list(processed_log.keys())
 
+
+def _index_stats(index, dead_vectors: int) -> dict:
+    return {
+        "vectors": int(index.ntotal),
+        "dead_vectors": int(dead_vectors),
+        "index_bytes": os.path.getsize(FAISS_INDEX_FILE),
+    }
+
+def vacuum_vector_store() -> dict:
+    """
+    Compacts the index after deletions: rebuilds it with only the vectors that
+    still have a chunk, keeping their IDs, and publishes the result.
+    Returns before/after size statistics.
+    """
+    with ingestion_lock():
+        return _vacuum_vector_store()
+
+def _vacuum_vector_store() -> dict:
+    if not os.path.exists(FAISS_INDEX_FILE):
+        print("No FAISS index found. Nothing to vacuum.")
+        return {}
+    index = faiss.read_index(FAISS_INDEX_FILE)
+    chunk_store = open_chunk_store(VECTOR_STORE_DIR)
+    doc_chunks = chunk_store.get_doc_chunks(max_vector_id=next_vector_id(index))
+    live_ids = np.array([vector_id for vector_ids in doc_chunks.values() for vector_id in vector_ids], dtype="int64")
+    before = _index_stats(index, len(np.setdiff1d(get_vector_ids(index), live_ids)))
+    if before["dead_vectors"] == 0 or len(live_ids) == 0:
+        print(f"Vacuum: no dead vectors to remove ({before['vectors']} vectors).")
+        return {"before": before, "after": before}
+
+    print(f"Vacuuming vector store: dropping {before['dead_vectors']} of {before['vectors']} vectors...")
+    index = convert_index(index, load_index_config(), keep_ids=live_ids)
+    write_index_atomic(index, FAISS_INDEX_FILE)
+    store_version = get_document_db().bump_version(VECTOR_STORE_VERSION)
+    vector_store_holder.publish(read_index(FAISS_INDEX_FILE, load_index_config()), chunk_store, store_version)
+    after = _index_stats(index, 0)
+    print(
+        f"Vacuum complete: {before['vectors']} -> {after['vectors']} vectors, "
+        f"{before['index_bytes'] / 2**20:.1f} -> {after['index_bytes'] / 2**20:.1f} MB"
+    )
+    return {"before": before, "after": after}
+
+def rescore_heatmaps(blocking: bool = True) -> dict:
+    """
+    Recomputes every document's heatmap from its stored lifecycles and the
+    current mapping.csv in one pass, without LLM calls, and saves metadata_db.
+    With blocking=False, raises IngestionBusyError instead of waiting for a
+    running ingestion or vacuum.
+    """
+    mapping = load_mapping_matrix(MAPPING_CSV_PATH)
+    if not mapping.lifecycles:
+        raise ValueError(f"{MAPPING_CSV_PATH} has no lifecycles; refusing to clear every heatmap.")
+    db = get_document_db()
+    # Ingestion writes metadata too; don't interleave with a run or with API edits
+    with ingestion_lock(blocking), db.transaction():
+        metadata_db = load_metadata_db()
+        changed = rescore_metadata(metadata_db, mapping)
+        db.put_many(METADATA_TABLE, {name: metadata_db[name] for name in changed})
+    print(f"Rescored heatmaps of {len(metadata_db)} documents ({len(changed)} changed).")
+    return {"documents": len(metadata_db), "changed": changed}
+
 # def process_pdfs_incrementally():
 #     print("Starting incremental PDF ingestion process (using spaCy Chunker)...")
 #     if not os.path.exists(PDF_SOURCE_DIR):
@@ -495,4 +1060,13 @@ def process_pdfs_incrementally():
 
 
 if __name__ == '__main__':
-    process_pdfs_incrementally()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Ingest new or modified PDFs, compact the vector index, or rescore heatmaps.")
+    parser.add_argument("command", nargs="?", choices=["ingest", "vacuum", "rescore"], default="ingest")
+    parser.add_argument("--workers", type=int, default=INGESTION_WORKERS, help="Worker processes for PDF parsing and chunking")
+    args = parser.parse_args()
+    if args.command == "vacuum":
+        vacuum_vector_store()
+    elif args.command == "rescore":
+        rescore_heatmaps()
+    else:
+        process_pdfs_incrementally(args.workers)
\ No newline at end of file
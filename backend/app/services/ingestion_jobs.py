@@ -0,0 +1,156 @@
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from .ingestion import process_pdfs_incrementally
+
+# Jobs submitted within this window of each other are ingested in one run
+JOB_BATCH_WINDOW_SECONDS = 1.0
+# Finished jobs kept for the status endpoints
+JOB_HISTORY_SIZE = 200
+# Runs a job gets for its files to show up as processed before it fails
+JOB_MAX_RUNS = 2
+
+
+class IngestionJob:
+    """Status of one upload or ingest request."""
+    def __init__(self, files: list[str] | None = None):
+        self.id = uuid.uuid4().hex
+        self.files = files or []
+        self.status = "queued"
+        self.progress: dict = {}
+        self.processed_files: list[str] | None = None
+        self.error: str | None = None
+        self.runs = 0
+        self.created_at = time.time()
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "files": self.files,
+            "progress": self.progress,
+            "processed_files": self.processed_files,
+            "error": self.error,
+            "runs": self.runs,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class IngestionJobQueue:
+    """
+    Runs ingestion on a single background worker thread, so uploads return
+    immediately instead of blocking the event loop for the whole parse, LLM
+    and embedding cycle. Every job queued while a run is pending or in
+    progress is handled by the next run, so a burst of concurrent uploads
+    becomes one index update. A job only completes once all of its files
+    are in the run's processed set; otherwise it is queued for a fresh run,
+    and fails after JOB_MAX_RUNS runs.
+    """
+    def __init__(self):
+        self._jobs: OrderedDict[str, IngestionJob] = OrderedDict()
+        self._queued: list[IngestionJob] = []
+        self._condition = threading.Condition()
+        self._worker: threading.Thread | None = None
+        self._stopping = False
+
+    def start(self):
+        with self._condition:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._stopping = False
+            self._worker = threading.Thread(target=self._run, name="ingestion-worker", daemon=True)
+            self._worker.start()
+
+    def stop(self):
+        """Lets the worker exit once the current run (if any) finishes."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+
+    def submit(self, files: list[str] | None = None) -> IngestionJob:
+        job = IngestionJob(files)
+        with self._condition:
+            self._jobs[job.id] = job
+            self._queued.append(job)
+            self._trim_history()
+            self._condition.notify_all()
+        self.start()
+        return job
+
+    def get(self, job_id: str) -> IngestionJob | None:
+        return self._jobs.get(job_id)
+
+    def list_jobs(self) -> list[IngestionJob]:
+        """Most recent first."""
+        with self._condition:
+            return list(reversed(self._jobs.values()))
+
+    def _trim_history(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in ("completed", "failed")]
+        for job_id in finished[:max(0, len(self._jobs) - JOB_HISTORY_SIZE)]:
+            del self._jobs[job_id]
+
+    def _next_batch(self) -> list[IngestionJob]:
+        with self._condition:
+            while not self._queued and not self._stopping:
+                self._condition.wait()
+            if self._stopping:
+                return []
+        # Give concurrent uploads a moment to join the same run
+        time.sleep(JOB_BATCH_WINDOW_SECONDS)
+        with self._condition:
+            batch, self._queued = self._queued, []
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            started_at = time.time()
+            for job in batch:
+                job.status = "running"
+                job.started_at = job.started_at or started_at
+                job.runs += 1
+
+            def update_progress(counters: dict):
+                for job in batch:
+                    job.progress = counters
+
+            print(f"INFO:     Ingestion run for {len(batch)} queued job(s) started.")
+            try:
+                processed_files = process_pdfs_incrementally(progress=update_progress)
+                status, error = "completed", None
+            except Exception as e:
+                print(f"Error during ingestion: {e}")
+                processed_files, status, error = None, "failed", str(e)
+            finished_at = time.time()
+            processed = set(processed_files or [])
+            retry = []
+            for job in batch:
+                job.processed_files = processed_files
+                job.error = error
+                missing = [name for name in job.files if name not in processed]
+                if status == "completed" and missing:
+                    # E.g. the file's analysis failed, or it landed after this run's scan
+                    if job.runs < JOB_MAX_RUNS:
+                        job.status = "queued"
+                        retry.append(job)
+                        continue
+                    job.error = f"Not ingested: {', '.join(missing)}"
+                job.finished_at = finished_at
+                job.status = "failed" if missing and status == "completed" else status
+            if retry:
+                print(f"INFO:     Re-queueing {len(retry)} job(s) whose files were not ingested by this run.")
+                with self._condition:
+                    self._queued.extend(retry)
+                    self._condition.notify_all()
+
+
+# Create a single, global instance of the queue
+ingestion_queue = IngestionJobQueue()
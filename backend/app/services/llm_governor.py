@@ -0,0 +1,102 @@
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+
+# Rough token estimate for budget accounting (~4 characters per token for English)
+CHARS_PER_TOKEN = 4
+
+
+def retryable_errors() -> tuple:
+    """Errors worth retrying: rate limits, timeouts, dropped connections and 5xx responses."""
+    # Imported here so the OpenAI SDK only loads once LLM calls are actually made
+    import openai
+    return (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)
+
+def estimate_tokens(text: str, completion_tokens: int = 0) -> int:
+    return len(text) // CHARS_PER_TOKEN + completion_tokens
+
+
+class RateLimitGovernor:
+    """
+    Admission control for concurrent async LLM calls. At most
+    `max_concurrency` calls are in flight, and over any sliding window of
+    `window_seconds` (a minute) at most `requests_per_minute` requests and
+    `tokens_per_minute` (estimated) tokens are sent. Transient failures are retried with exponential backoff
+    and jitter, honouring the server's Retry-After header when present.
+    """
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int, max_concurrency: int,
+                 max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 60.0, window_seconds: float = 60.0):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.window_seconds = window_seconds
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._lock = asyncio.Lock()
+        # (monotonic time, estimated tokens) of the requests sent in the current window
+        self._sent: deque[tuple[float, int]] = deque()
+        self.requests = 0
+        self.retries = 0
+
+    async def _acquire(self, tokens: int):
+        # A single request larger than the budget still goes through, alone
+        tokens = min(tokens, self.tokens_per_minute)
+        while True:
+            async with self._lock:
+                now = time.monotonic()
+                while self._sent and now - self._sent[0][0] >= self.window_seconds:
+                    self._sent.popleft()
+                used = sum(sent_tokens for _, sent_tokens in self._sent)
+                if len(self._sent) < self.requests_per_minute and used + tokens <= self.tokens_per_minute:
+                    self._sent.append((now, tokens))
+                    return
+                wait = self.window_seconds - (now - self._sent[0][0])
+            await asyncio.sleep(max(wait, 0.05))
+
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        try:
+            return min(self.max_delay, float(retry_after))
+        except (TypeError, ValueError):
+            return min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+    async def run(self, call, tokens: int):
+        """Awaits `call()` (a coroutine factory) once the budget allows, retrying transient errors."""
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(tokens)
+            async with self._semaphore:
+                self.requests += 1
+                try:
+                    return await call()
+                except retryable_errors() as e:
+                    if attempt == self.max_retries:
+                        raise
+                    error_name, delay = type(e).__name__, self._retry_delay(e, attempt)
+            self.retries += 1
+            print(f"    - LLM call failed ({error_name}); retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+
+class BackgroundEventLoop:
+    """
+    An asyncio event loop on a daemon thread, so synchronous code (the
+    ingestion pipeline) can hand off coroutines and keep going.
+    """
+    def __init__(self):
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="llm-event-loop", daemon=True).start()
+            return self._loop
+
+    def submit(self, coroutine):
+        """Schedules `coroutine` and returns a concurrent.futures.Future for its result."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self._ensure_loop())
@@ -0,0 +1,111 @@
+import os
+import json
+import zlib
+import sqlite3
+import threading
+from typing import Iterator
+from langchain_core.documents import Document
+
+VECTOR_STORE_DIR = "data/vector_store"
+PAGE_CACHE_PATH = os.path.join(VECTOR_STORE_DIR, "page_text.db")
+PAGE_COMPRESSION_LEVEL = 6
+
+
+class PageTextCache:
+    """
+    Extracted PDF text, one zlib-compressed row per page, keyed by the
+    file's SHA-256 content hash, so every consumer (chunking, LLM analysis,
+    podcasts) shares one extraction and renamed or copied files reuse it.
+    A document's pages are written in one transaction, so a hash is either
+    fully cached or not at all.
+    """
+    def __init__(self, path: str = PAGE_CACHE_PATH):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS documents (content_hash TEXT PRIMARY KEY, pages INTEGER NOT NULL)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages (content_hash TEXT NOT NULL, page INTEGER NOT NULL, "
+                "text BLOB NOT NULL, metadata TEXT NOT NULL, PRIMARY KEY (content_hash, page))"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread, and a fresh one in forked parse workers
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            # Parse workers write concurrently; wait for each other's transactions
+            conn = sqlite3.connect(self.path, timeout=60)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def page_count(self, content_hash: str) -> int | None:
+        """Number of cached pages, or None if the document is not cached."""
+        row = self._connect().execute("SELECT pages FROM documents WHERE content_hash = ?", (content_hash,)).fetchone()
+        return row[0] if row else None
+
+    def put_pages(self, content_hash: str, pages: list[Document]):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM pages WHERE content_hash = ?", (content_hash,))
+            conn.executemany(
+                "INSERT INTO pages (content_hash, page, text, metadata) VALUES (?, ?, ?, ?)",
+                [
+                    (content_hash, i, zlib.compress(page.page_content.encode("utf-8"), PAGE_COMPRESSION_LEVEL), json.dumps(page.metadata))
+                    for i, page in enumerate(pages)
+                ]
+            )
+            conn.execute("INSERT OR REPLACE INTO documents (content_hash, pages) VALUES (?, ?)", (content_hash, len(pages)))
+
+    def iter_pages(self, content_hash: str, start: int = 0, stop: int | None = None) -> Iterator[Document]:
+        """Lazily yields pages [start, stop) in order, decompressing one page at a time."""
+        cursor = self._connect().execute(
+            "SELECT text, metadata FROM pages WHERE content_hash = ? AND page >= ? AND page < ? ORDER BY page",
+            (content_hash, start, stop if stop is not None else 2**62)
+        )
+        for text, metadata in cursor:
+            yield Document(page_content=zlib.decompress(text).decode("utf-8"), metadata=json.loads(metadata))
+
+    def get_text(self, content_hash: str, start: int = 0, stop: int | None = None,
+                 separator: str = "\n", max_chars: int | None = None) -> str:
+        """
+        The pages' text joined by `separator`. With `max_chars`, stops reading
+        pages once that much text is available and truncates to it.
+        """
+        parts = []
+        length = 0
+        for page in self.iter_pages(content_hash, start, stop):
+            if parts:
+                parts.append(separator)
+                length += len(separator)
+            parts.append(page.page_content)
+            length += len(page.page_content)
+            if max_chars is not None and length >= max_chars:
+                break
+        text = "".join(parts)
+        return text[:max_chars] if max_chars is not None else text
+
+    def retain(self, content_hashes: set[str]) -> int:
+        """Drops every cached document whose hash is not in `content_hashes`. Returns how many."""
+        conn = self._connect()
+        stale = [
+            (content_hash,) for (content_hash,) in conn.execute("SELECT content_hash FROM documents")
+            if content_hash not in content_hashes
+        ]
+        if stale:
+            with conn:
+                conn.executemany("DELETE FROM pages WHERE content_hash = ?", stale)
+                conn.executemany("DELETE FROM documents WHERE content_hash = ?", stale)
+        return len(stale)
+
+
+_page_cache: PageTextCache | None = None
+_page_cache_lock = threading.Lock()
+
+def get_page_cache() -> PageTextCache:
+    """The process-wide page text cache, opened on first use."""
+    global _page_cache
+    with _page_cache_lock:
+        if _page_cache is None:
+            _page_cache = PageTextCache()
+        return _page_cache
@@ -1,52 +1,72 @@
 import os
-import csv
 import re
 from datetime import datetime
 from dateutil.parser import parse as parse_date 
 from dateutil import relativedelta
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_community.vectorstores import FAISS
 from langchain_core.output_parsers import JsonOutputParser, StrOutputParser
 from langchain_core.prompts import PromptTemplate
-from langgraph.graph import StateGraph, END
 from typing import Dict, Any, List
-import json
+from functools import lru_cache
 
 from .graph_state import GraphState # Ensure this is your latest version
-from .ingestion import load_metadata_db
+from .ingestion import load_document_metadata
+from .facet_index import get_metadata_facets
+from .document_db import get_document_db, WriteBehindTable, ANALYSIS_CACHE_TABLE
+from .vector_store import vector_store_holder
+from .embedding_cache import CachedQueryEmbeddings, LazyEmbeddings
+from .heatmap import MAPPING_CSV_PATH, BUSINESS_DIVISIONS, load_mapping_matrix
+from .retrieval import multi_query_search, filtered_similarity_search, get_document_chunks
 
 # --- Constants and Model Initialization ---
 os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
 load_dotenv()
 VECTOR_STORE_DIR = "data/vector_store"
-LLM = ChatOpenAI(model="gpt-4-turbo", temperature=0, stream=False)
-MAPPING_CSV_PATH = "./data/mapping.csv"
-EMBEDDINGS = OpenAIEmbeddings(model="text-embedding-3-small", chunk_size=500)
-
-# --- DEFINITIVE: Business Division columns as specified ---
-BUSINESS_DIVISIONS = ["AMO", "COO Ops Americas", "COO Ops S&I", "GOTO Operations & COO", "IB Operations (BA)", "P&C Operations", "Treasury"]
-
-ANALYSIS_CACHE_PATH = os.path.join(VECTOR_STORE_DIR, "analysis_cache.json")
+LLM_MODEL = "gpt-4-turbo"
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+# The OpenAI clients and the LangGraph workflow are built on first use, so
+# workers that only serve metadata never import or construct them.
+@lru_cache(maxsize=None)
+def get_llm():
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(model=LLM_MODEL, temperature=0, stream=False)
+
+def _openai_embeddings():
+    from langchain_openai import OpenAIEmbeddings
+    return OpenAIEmbeddings(model=EMBEDDING_MODEL, chunk_size=500)
+
+# Query embeddings go through a persistent cache (memory LRU + on-disk tier)
+EMBEDDINGS = CachedQueryEmbeddings(LazyEmbeddings(_openai_embeddings, EMBEDDING_MODEL))
+vector_store_holder.set_embeddings(EMBEDDINGS)
+
+# Saved analyses live in documents.db, one row per document
+# Saves are applied in memory at once and written behind in batches (started and
+# flushed by the API's lifespan); without a running flusher they write through
+ANALYSIS_CACHE_WRITER = WriteBehindTable(
+    ANALYSIS_CACHE_TABLE,
+    flush_interval=float(os.getenv("ANALYSIS_CACHE_FLUSH_SECONDS", 2.0)),
+    max_pending=int(os.getenv("ANALYSIS_CACHE_FLUSH_ROWS", 100))
+)
 
 def load_analysis_cache():
-    """Loads the persistent analysis cache from a JSON file."""
-    if os.path.exists(ANALYSIS_CACHE_PATH):
-        with open(ANALYSIS_CACHE_PATH, 'r') as f:
-            try:
-                return json.load(f)
-            except json.JSONDecodeError:
-                return {} # Return empty if file is corrupted or empty
-    return {}
+    """Loads the whole persistent analysis cache, including saves not yet flushed."""
+    return ANALYSIS_CACHE_WRITER.get_all()
 
 def save_analysis_cache(data):
-    """Saves the analysis cache to a JSON file."""
-    with open(ANALYSIS_CACHE_PATH, 'w') as f:
-        json.dump(data, f, indent=2)
+    """Replaces the whole analysis cache; prefer save_cached_analysis for one document."""
+    ANALYSIS_CACHE_WRITER.flush()
+    get_document_db().replace_all(ANALYSIS_CACHE_TABLE, data)
+
+def load_cached_analysis(document_name: str) -> dict | None:
+    return ANALYSIS_CACHE_WRITER.get(document_name)
+
+def save_cached_analysis(document_name: str, analysis: dict):
+    ANALYSIS_CACHE_WRITER.put(document_name, analysis)
 
 def load_mapping_data():
-    with open(MAPPING_CSV_PATH, mode='r', encoding='utf-8') as infile:
-        return [row for row in csv.DictReader(infile)]
+    # Parsed and compiled once, then reused until mapping.csv changes
+    return load_mapping_matrix(MAPPING_CSV_PATH).rows
 
 # --- GRAPH NODES ---
 def process_and_sort_timeline(key_dates: list[dict]) -> list[dict]:
@@ -95,9 +115,12 @@ def process_and_sort_timeline(key_dates: list[dict]) -> list[dict]:
 
 def retrieve_docs_node(state):
     print("---NODE 1: Retrieving Broad Context---")
-    vector_store = FAISS.load_local(VECTOR_STORE_DIR, EMBEDDINGS, allow_dangerous_deserialization=True)
-    retriever = vector_store.as_retriever(search_kwargs={"k": 25})
-    docs = retriever.invoke(f"All information about the document: {state['document_name']}")
+    snapshot = vector_store_holder.get()
+    # Fetch the document's own chunks directly (no embedding call), falling
+    # back to a semantic search for documents missing from the chunk index
+    docs = get_document_chunks(snapshot, state['document_name'], max_chunks=25)
+    if not docs:
+        docs = filtered_similarity_search(snapshot, f"All information about the document: {state['document_name']}", k=25)
     return {"retrieved_docs": docs}
 
 def generate_full_report_node(state):
@@ -121,7 +144,7 @@ def generate_full_report_node(state):
         input_variables=["context", "all_functions"]
     )
     
-    chain = prompt | LLM | JsonOutputParser()
+    chain = prompt | get_llm() | JsonOutputParser()
     
     try:
         generation = chain.invoke({
@@ -152,13 +175,17 @@ def generate_full_report_node(state):
             "impactedLifecycles": []
         }}
 
-workflow = StateGraph(GraphState)
-workflow.add_node("retrieve_docs", retrieve_docs_node)
-workflow.add_node("generate_full_report", generate_full_report_node)
-workflow.set_entry_point("retrieve_docs")
-workflow.add_edge("retrieve_docs", "generate_full_report")
-workflow.add_edge("generate_full_report", END)
-rag_app = workflow.compile()
+@lru_cache(maxsize=None)
+def get_rag_app():
+    """Compiles the report workflow on first use."""
+    from langgraph.graph import StateGraph, END
+    workflow = StateGraph(GraphState)
+    workflow.add_node("retrieve_docs", retrieve_docs_node)
+    workflow.add_node("generate_full_report", generate_full_report_node)
+    workflow.set_entry_point("retrieve_docs")
+    workflow.add_edge("retrieve_docs", "generate_full_report")
+    workflow.add_edge("generate_full_report", END)
+    return workflow.compile()
 
 
 def analyze_document_logic(document_name: str):
@@ -167,15 +194,14 @@ def analyze_document_logic(document_name: str):
     """
     # 1. Run the existing, stable RAG pipeline for prose generation
     inputs = {"document_name": document_name}
-    final_state = rag_app.invoke(inputs)
+    final_state = get_rag_app().invoke(inputs)
     final_output = final_state.get('final_generation')
 
     if not final_output:
         raise Exception("Qualitative analysis generation failed.")
     
     # 2. Augment the output with pre-computed data from the metadata DB
-    metadata_db = load_metadata_db()
-    document_meta = metadata_db.get(document_name, {})
+    document_meta = load_document_metadata(document_name) or {}
     
     # Add the heatmap data if it exists
     final_output['heatmapData'] = document_meta.get('heatmapData', None)
@@ -223,7 +249,7 @@ def chat_with_documents_logic(
         Original question: {question}""",
         input_variables=["question"],
     )
-    query_gen_chain = query_gen_prompt | LLM | JsonOutputParser()
+    query_gen_chain = query_gen_prompt | get_llm() | JsonOutputParser()
     generated_queries = query_gen_chain.invoke({"question": question})
     # Also include the original question for good measure
     generated_queries.append(question)
@@ -232,59 +258,23 @@ def chat_with_documents_logic(
     # --- METADATA FILTERING LOGIC ---
 
     # --- 1. Filter by metadata DB first ---
-    metadata_db = load_metadata_db()
-    allowed_filenames = list(metadata_db.keys())
-
-    if tags:
-        allowed_filenames = [
-            fname for fname in allowed_filenames
-            if all(tag.lower() in [t.lower() for t in metadata_db[fname].get('tags', [])] for tag in tags)
-        ]
-    
-    if regions:
-        allowed_filenames = [
-            fname for fname in allowed_filenames
-            if all(region.lower() in [r.lower() for r in metadata_db[fname].get('regions', [])] for region in regions)
-        ]
-    
+    # Intersects the tag and region postings of the facet index instead of scanning every document
+    allowed_filenames = get_metadata_facets().match(tags=tags, regions=regions)
+
     if not allowed_filenames:
         return {"answer": "No documents match the specified tag or region filters."}
     
-    # --- 2. Build the FAISS filter lambda function ---
-    def metadata_filter(metadata: dict) -> bool:
-        # Filter by filename first
-        if metadata.get("source_file") not in allowed_filenames:
-            return False
-        
-        # Then filter by date
-        pub_date_str = metadata.get("publication_date")
-        if not pub_date_str: return False
-        if start_date and pub_date_str < start_date: return False
-        if end_date and pub_date_str > end_date: return False
-        
-        return True
-
-    filter_lambda = None
-    filter_lambda = metadata_filter
-
-
-    # 2. Retrieve documents for each query
-    vector_store = FAISS.load_local(VECTOR_STORE_DIR, EMBEDDINGS, allow_dangerous_deserialization=True)
-    # Apply the filter if it exists
-    search_kwargs = {"k": 5}
-    if filter_lambda:
-        search_kwargs["filter"] = filter_lambda
-
-    retriever = vector_store.as_retriever(search_kwargs=search_kwargs)    
-    # retriever = vector_store.as_retriever(search_kwargs={"k": 5})
-    
-    unique_docs = {}
-    for q in generated_queries:
-        docs = retriever.invoke(q)
-        for doc in docs:
-            unique_docs[doc.page_content] = doc
-    
-    retrieved_docs = list(unique_docs.values())
+    # --- 2. Retrieve documents for all queries in one batch ---
+    # The filter resolves to a set of FAISS vector IDs (by source file and
+    # publication date), all query variants are embedded in one call, and the
+    # per-query hits are merged with reciprocal rank fusion.
+    retrieved_docs = multi_query_search(
+        vector_store_holder.get(), generated_queries, k=5,
+        source_files=allowed_filenames,
+        start_date=start_date,
+        end_date=end_date,
+        require_date=True
+    )
     docs_context = "\n\n---\n\n".join([d.page_content for d in retrieved_docs])
     print(f"Retrieved {len(retrieved_docs)} unique chunks for context.")
 
@@ -304,7 +294,7 @@ def chat_with_documents_logic(
         input_variables=["context", "question"]
     )
     
-    final_chain = final_prompt | LLM | StrOutputParser()
+    final_chain = final_prompt | get_llm() | StrOutputParser()
     answer = final_chain.invoke({
         "context": docs_context,
         "question": question
@@ -0,0 +1,237 @@
+import numpy as np
+import faiss
+from langchain_core.documents import Document
+from .index_factory import make_search_params, get_vector_ids
+
+# Selections of up to this share of the index (at least SUBSET_SCAN_MIN_IDS,
+# at most SUBSET_SCAN_MAX_IDS vectors) are scored directly from their stored
+# vectors, so the cost depends on the size of the selection, not the corpus.
+# Larger selections go through the index with an ID selector.
+SUBSET_SCAN_FRACTION = 0.02
+SUBSET_SCAN_MIN_IDS = 1000
+SUBSET_SCAN_MAX_IDS = 20000
+# Standard reciprocal rank fusion constant (Cormack et al.)
+RRF_K = 60
+
+
+class FilteredSearchIndex:
+    """
+    Maps metadata (source file, publication date) to FAISS vector IDs so that
+    filtered searches can be restricted inside the index instead of
+    over-fetching candidates and post-filtering them with a Python lambda.
+    """
+    def __init__(self, doc_chunks: dict[str, list[int]], date_by_file: dict[str, str | None]):
+        self.ids_by_file = {
+            source_file: np.sort(np.array(vector_ids, dtype="int64"))
+            for source_file, vector_ids in doc_chunks.items() if vector_ids
+        }
+        self.date_by_file = date_by_file
+
+    def select_files(
+        self,
+        source_files=None,
+        start_date: str | None = None,
+        end_date: str | None = None,
+        require_date: bool = False
+    ) -> set[str]:
+        """
+        Returns the indexed files that are in `source_files` (all files if
+        None) and whose publication date falls inside the optional range.
+        """
+        candidates = self.ids_by_file.keys() if source_files is None else source_files
+        selected = set()
+        for fname in candidates:
+            if fname not in self.ids_by_file:
+                continue
+            pub_date_str = self.date_by_file.get(fname)
+            if start_date or end_date or require_date:
+                if not pub_date_str: continue
+                if start_date and pub_date_str < start_date: continue
+                if end_date and pub_date_str > end_date: continue
+            selected.add(fname)
+        return selected
+
+    def ids_of(self, files) -> np.ndarray:
+        """Sorted vector IDs of the chunks of `files`."""
+        selected = [self.ids_by_file[fname] for fname in files]
+        if not selected:
+            return np.empty(0, dtype="int64")
+        return np.sort(np.concatenate(selected))
+
+    def count(self, files) -> int:
+        return sum(len(self.ids_by_file[fname]) for fname in files)
+
+
+def exact_search(index, query_vectors: np.ndarray, k: int, ids: np.ndarray):
+    """
+    Exact L2 k-NN over the vectors `ids`, scored straight from their stored
+    vectors in blocks of SUBSET_SCAN_MAX_IDS, so memory stays bounded.
+    """
+    query_vectors = np.ascontiguousarray(query_vectors, dtype="float32")
+    query_norms = (query_vectors ** 2).sum(axis=1)[:, None]
+    best_distances = np.full((len(query_vectors), k), np.inf, dtype="float32")
+    best_labels = np.full((len(query_vectors), k), -1, dtype="int64")
+    for start in range(0, len(ids), SUBSET_SCAN_MAX_IDS):
+        block = ids[start:start + SUBSET_SCAN_MAX_IDS]
+        vectors = index.reconstruct_batch(block)
+        distances = query_norms - 2 * query_vectors @ vectors.T + (vectors ** 2).sum(axis=1)[None, :]
+        # Merge the block into the running top k
+        merged_distances = np.concatenate([best_distances, distances.astype("float32")], axis=1)
+        merged_labels = np.concatenate([best_labels, np.broadcast_to(block, distances.shape)], axis=1)
+        order = np.argsort(merged_distances, axis=1, kind="stable")[:, :k]
+        best_distances = np.take_along_axis(merged_distances, order, axis=1)
+        best_labels = np.take_along_axis(merged_labels, order, axis=1)
+    return best_distances, best_labels
+
+
+def subset_scan_limit(index) -> int:
+    """Largest selection scored directly rather than searched through the index."""
+    return min(SUBSET_SCAN_MAX_IDS, max(SUBSET_SCAN_MIN_IDS, int(SUBSET_SCAN_FRACTION * index.ntotal)))
+
+
+def search_vectors(index, query_vectors: np.ndarray, k: int, ids: np.ndarray | None = None,
+                   exclude_ids: np.ndarray | None = None, exclude_selector=None):
+    """
+    Runs a k-NN search for each row of `query_vectors`, restricted either to
+    `ids` or to everything but `exclude_ids` (dead vectors, and the vectors
+    of filtered-out files), through `exclude_selector` when the caller has
+    one prebuilt (see VectorStoreSnapshot).
+    Returns (distances, labels) like `index.search`, with -1 labels
+    only when fewer than k vectors are eligible: on IVF and HNSW, queries for
+    which the filtered search came back short are rescored exactly.
+    """
+    query_vectors = np.ascontiguousarray(query_vectors, dtype="float32")
+    if ids is not None and len(ids) <= subset_scan_limit(index):
+        # Small selection: score the selected vectors directly (exact L2)
+        return exact_search(index, query_vectors, k, ids)
+
+    if ids is None:
+        if exclude_ids is None or len(exclude_ids) == 0:
+            return index.search(query_vectors, k)
+        if exclude_selector is None:
+            # Keep the inner selector referenced for as long as the search runs
+            exclude_batch = faiss.IDSelectorBatch(exclude_ids)
+            exclude_selector = faiss.IDSelectorNot(exclude_batch)
+        selector, eligible = exclude_selector, index.ntotal - len(exclude_ids)
+    else:
+        # Large selection: let FAISS skip non-selected vectors inside the index
+        selector, eligible = faiss.IDSelectorBatch(ids), len(ids)
+
+    params = make_search_params(index, selector, selectivity=eligible / max(index.ntotal, 1))
+    distances, labels = index.search(query_vectors, k, params=params)
+    short = (labels >= 0).sum(axis=1) < min(k, eligible)
+    if short.any():
+        eligible_ids = ids if ids is not None else np.setdiff1d(get_vector_ids(index), exclude_ids)
+        distances[short], labels[short] = exact_search(index, query_vectors[short], k, eligible_ids)
+    return distances, labels
+
+
+def resolve_filter(snapshot, source_files=None, start_date: str | None = None,
+                   end_date: str | None = None, require_date: bool = False) -> dict:
+    """
+    Turns the metadata filters into the cheapest search_vectors restriction,
+    as keyword arguments:
+    - every live file eligible (e.g. chat without tags): no restriction
+      beyond the snapshot's prebuilt dead-vector selector;
+    - a small selection: `ids`, scored directly;
+    - most files eligible (e.g. only `require_date`): the dead vectors plus
+      the few excluded files' vectors, as a selector cached on the snapshot;
+    - otherwise: `ids`, searched through the index.
+    Returns None when no vector is eligible.
+    """
+    filter_index = snapshot.filter_index
+    if source_files is None and not (start_date or end_date or require_date):
+        files = filter_index.ids_by_file.keys()
+    else:
+        files = filter_index.select_files(source_files, start_date, end_date, require_date)
+    if not files:
+        return None
+    excluded = frozenset(filter_index.ids_by_file.keys() - files)
+    if not excluded:
+        return {"exclude_ids": snapshot.dead_ids, "exclude_selector": snapshot.dead_selector}
+    eligible = filter_index.count(files)
+    if eligible > subset_scan_limit(snapshot.store.index) and filter_index.count(excluded) <= eligible:
+        exclude_ids, exclude_selector = snapshot.exclusion(excluded)
+        return {"exclude_ids": exclude_ids, "exclude_selector": exclude_selector}
+    return {"ids": filter_index.ids_of(files)}
+
+
+def filtered_similarity_search(
+    snapshot,
+    query: str,
+    k: int,
+    source_files=None,
+    start_date: str | None = None,
+    end_date: str | None = None,
+    require_date: bool = False
+) -> list[Document]:
+    """
+    Similarity search restricted to chunks matching the metadata filters.
+    Always returns k documents when at least k chunks match.
+    """
+    store = snapshot.store
+    restriction = resolve_filter(snapshot, source_files, start_date, end_date, require_date)
+    if restriction is None:
+        return []
+    query_vector = np.array([store.embeddings.embed_query(query)], dtype="float32")
+    _, labels = search_vectors(store.index, query_vector, k, **restriction)
+    return store.get_documents(labels[0])
+
+
+def reciprocal_rank_fusion(ranked_lists, rrf_k: int = RRF_K) -> list[int]:
+    """
+    Fuses several ranked lists of vector IDs into one ranking.
+    Each ID scores sum(1 / (rrf_k + rank)) over the lists it appears in.
+    """
+    scores: dict[int, float] = {}
+    for ranked in ranked_lists:
+        for rank, vector_id in enumerate(ranked):
+            vector_id = int(vector_id)
+            if vector_id < 0:
+                continue
+            scores[vector_id] = scores.get(vector_id, 0.0) + 1.0 / (rrf_k + rank + 1)
+    return sorted(scores, key=lambda vector_id: scores[vector_id], reverse=True)
+
+
+def multi_query_search(
+    snapshot,
+    queries: list[str],
+    k: int,
+    source_files=None,
+    start_date: str | None = None,
+    end_date: str | None = None,
+    require_date: bool = False
+) -> list[Document]:
+    """
+    Retrieves documents for several query variants at once: all queries are
+    embedded in a single embeddings call, searched with one matrix FAISS
+    search, and the per-query rankings are merged with reciprocal rank fusion.
+    """
+    if not queries:
+        return []
+    store = snapshot.store
+    restriction = resolve_filter(snapshot, source_files, start_date, end_date, require_date)
+    if restriction is None:
+        return []
+    query_vectors = np.array(store.embeddings.embed_documents(queries), dtype="float32")
+    _, labels = search_vectors(store.index, query_vectors, k, **restriction)
+    fused_ids = reciprocal_rank_fusion(labels)
+    return store.get_documents(fused_ids)
+
+
+def get_document_chunks(snapshot, source_file: str, max_chunks: int | None = None) -> list[Document]:
+    """
+    Returns a document's chunks in page order straight from the chunk index,
+    without any embedding call. If the document has more than `max_chunks`
+    chunks, a local ranking picks a representative, non-redundant subset:
+    maximal marginal relevance against the centroid of the document's vectors.
+    """
+    store = snapshot.store
+    vector_ids = snapshot.doc_chunks.get(source_file, [])
+    if max_chunks is not None and len(vector_ids) > max_chunks:
+        from langchain_community.vectorstores.utils import maximal_marginal_relevance
+        vectors = store.index.reconstruct_batch(np.array(vector_ids, dtype="int64"))
+        centroid = vectors.mean(axis=0)
+        picked = maximal_marginal_relevance(centroid, vectors, k=max_chunks)
+        vector_ids = [vector_ids[i] for i in sorted(picked)]
+    return store.get_documents(vector_ids)
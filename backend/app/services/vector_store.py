@@ -0,0 +1,170 @@
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+import faiss
+from langchain_core.documents import Document
+from .retrieval import FilteredSearchIndex
+from .index_factory import load_index_config, read_index, get_vector_ids, next_vector_id
+from .chunk_store import ChunkStore, open_chunk_store
+from .document_db import get_document_db, VECTOR_STORE_VERSION
+
+VECTOR_STORE_DIR = "data/vector_store"
+FAISS_INDEX_FILE = os.path.join(VECTOR_STORE_DIR, "index.faiss")
+# Filter exclusion selectors kept per snapshot (see VectorStoreSnapshot.exclusion)
+CACHED_EXCLUSIONS = 8
+
+
+class VectorStore:
+    """
+    A FAISS index paired with the on-disk chunk store that holds each
+    vector's text and metadata (keyed by vector ID).
+    """
+    def __init__(self, index: faiss.Index, chunk_store: ChunkStore, embeddings):
+        self.index = index
+        self.chunk_store = chunk_store
+        self.embeddings = embeddings
+
+    def get_documents(self, vector_ids) -> list[Document]:
+        """Lazily fetches the chunks for the given vector IDs, in order."""
+        return self.chunk_store.get_documents(vector_ids)
+
+
+class VectorStoreSnapshot:
+    """
+    An immutable, published version of the FAISS vector store.
+    Readers keep a reference to the snapshot they started with, so a swap
+    in the middle of a query never changes the data they are searching.
+    """
+    def __init__(self, store: VectorStore, version: int, doc_chunks: dict[str, list[int]],
+                 filter_index: FilteredSearchIndex, dead_ids: np.ndarray):
+        self.store = store
+        self.version = version
+        # Source file -> chunk vector IDs in page order
+        self.doc_chunks = doc_chunks
+        # Metadata -> vector ID maps used to restrict filtered searches
+        self.filter_index = filter_index
+        # Vectors of deleted or replaced chunks still in the index until it is vacuumed
+        self.dead_ids = dead_ids
+        # Selector excluding them, built once per version and shared by every
+        # unfiltered search (IDSelectorNot doesn't own the batch; keep it referenced)
+        self._dead_batch = faiss.IDSelectorBatch(dead_ids) if len(dead_ids) else None
+        self.dead_selector = faiss.IDSelectorNot(self._dead_batch) if self._dead_batch is not None else None
+        # Excluded file set -> (excluded IDs, selector), most recent last
+        self._exclusions: OrderedDict[frozenset, tuple] = OrderedDict()
+        self._exclusions_lock = threading.Lock()
+
+    def exclusion(self, excluded_files: frozenset) -> tuple:
+        """
+        The dead vectors plus the vectors of `excluded_files`, with a selector
+        skipping them, as (ids, selector). Built once per file set and version
+        (e.g. the undated files for date-restricted chat), so a filter that
+        keeps most of the corpus costs no per-query selector build.
+        """
+        with self._exclusions_lock:
+            cached = self._exclusions.get(excluded_files)
+            if cached is not None:
+                self._exclusions.move_to_end(excluded_files)
+                return cached
+        ids = np.union1d(self.dead_ids, self.filter_index.ids_of(excluded_files))
+        batch = faiss.IDSelectorBatch(ids)
+        selector = faiss.IDSelectorNot(batch)
+        # IDSelectorNot does not own its inner selector: tie their lifetimes
+        selector.referenced_objects = [batch]
+        cached = (ids, selector)
+        with self._exclusions_lock:
+            self._exclusions[excluded_files] = cached
+            while len(self._exclusions) > CACHED_EXCLUSIONS:
+                self._exclusions.popitem(last=False)
+        return cached
+
+
+class VectorStoreHolder:
+    """
+    Process-wide holder for the resident FAISS vector store.
+    The store is loaded from disk once (during the FastAPI lifespan) and then
+    shared by every request. Ingestion builds a new store on the side and
+    publishes it with `publish()`, which atomically replaces the snapshot.
+    Publishers bump VECTOR_STORE_VERSION in documents.db, so a store written
+    by another process (another API worker, the CLI) is reloaded by `get()`.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._snapshot: VectorStoreSnapshot | None = None
+        self._embeddings = None
+        self._vector_store_dir = VECTOR_STORE_DIR
+        # VECTOR_STORE_VERSION the current snapshot was read at
+        self._store_version = None
+
+    def load(self, embeddings, vector_store_dir: str = VECTOR_STORE_DIR) -> VectorStoreSnapshot | None:
+        """Loads the store from disk and publishes it. Returns None if no index exists yet."""
+        self._embeddings = embeddings
+        self._vector_store_dir = vector_store_dir
+        # Read before the files: a change made meanwhile triggers another reload
+        store_version = get_document_db().version(VECTOR_STORE_VERSION)
+        if not os.path.exists(os.path.join(vector_store_dir, "index.faiss")):
+            print(f"WARNING: No FAISS index found in {vector_store_dir}. Vector store not loaded.")
+            return None
+        index_config = load_index_config(os.path.join(vector_store_dir, "index_config.json"))
+        index = read_index(os.path.join(vector_store_dir, "index.faiss"), index_config)
+        chunk_store = open_chunk_store(vector_store_dir)
+        return self.publish(index, chunk_store, store_version)
+
+    def publish(self, index: faiss.Index, chunk_store: ChunkStore, store_version: int | None = None) -> VectorStoreSnapshot:
+        """
+        Atomically makes `index` the current version for all new readers.
+        `store_version` is the VECTOR_STORE_VERSION the index and chunk store
+        were read at (after the publisher's bump when it just wrote them).
+        """
+        # Queries always go through the registered (cached) query embeddings
+        store = VectorStore(index, chunk_store, self._embeddings)
+        # Only chunks the index already contains belong to this version
+        doc_chunks = store.chunk_store.get_doc_chunks(max_vector_id=next_vector_id(index))
+        filter_index = FilteredSearchIndex(doc_chunks, store.chunk_store.get_publication_dates())
+        live_ids = [vector_id for vector_ids in doc_chunks.values() for vector_id in vector_ids]
+        dead_ids = np.setdiff1d(get_vector_ids(index), np.array(live_ids, dtype="int64"))
+        with self._lock:
+            version = self._snapshot.version + 1 if self._snapshot else 1
+            self._snapshot = VectorStoreSnapshot(store, version, doc_chunks, filter_index, dead_ids)
+            if store_version is not None:
+                self._store_version = store_version
+        print(f"INFO:     Published vector store version {version} ({store.index.ntotal} vectors, {len(dead_ids)} dead).")
+        return self._snapshot
+
+    def get(self) -> VectorStoreSnapshot:
+        """
+        Returns the current snapshot, lazily loading it on first use
+        (e.g. when the service functions are called outside the API server).
+        """
+        snapshot = self._snapshot
+        if snapshot is not None and not self._changed_on_disk():
+            return snapshot
+        with self._load_lock:
+            # Another thread may have finished (re)loading while we waited
+            if self._snapshot is not None:
+                if self._changed_on_disk():
+                    print("INFO:     Vector store changed on disk, reloading...")
+                    self.load(self._embeddings, self._vector_store_dir)
+                return self._snapshot
+            if self._embeddings is None:
+                raise RuntimeError("Vector store has not been loaded. Call vector_store_holder.load() first.")
+            snapshot = self.load(self._embeddings)
+        if snapshot is None:
+            raise FileNotFoundError("Vector store 'index.faiss' not found. Run the ingestion first.")
+        return snapshot
+
+    def _changed_on_disk(self) -> bool:
+        # One indexed lookup, like TableCache; snapshots published without a version are never reloaded
+        return self._store_version is not None and get_document_db().version(VECTOR_STORE_VERSION) != self._store_version
+
+    def get_store(self) -> VectorStore:
+        return self.get().store
+
+    def set_embeddings(self, embeddings):
+        """Registers the embeddings used for lazy loading, without touching disk."""
+        self._embeddings = embeddings
+
+
+# Create a single, global instance of the holder
+vector_store_holder = VectorStoreHolder()
@@ -0,0 +1,91 @@
+"""
+Chunks-per-second benchmark for the sentence chunker.
+
+Compares the previous chunker (en_core_web_sm with only ner/parser disabled,
+one nlp() call per page) with the current one (sentencizer-only pipeline,
+batched nlp.pipe, optionally multi-process) on the PDFs in
+data/pdfs_to_process, and checks that both produce identical chunks.
+
+Usage (from the backend directory):
+    python benchmarks/chunker_benchmark.py --repeat 3 --n-process 1 4
+    python benchmarks/chunker_benchmark.py --blank   # without en_core_web_sm
+"""
+import os
+import sys
+import time
+import argparse
+import spacy
+from langchain_community.document_loaders import PyMuPDFLoader
+from langchain_core.documents import Document
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.services import ingestion
+
+
+def legacy_sentence_chunker(nlp, docs: list[Document], max_chunk_chars: int = 1500) -> list[Document]:
+    """The chunker as it was before batching: one full-pipeline call per page."""
+    all_chunks = []
+    for doc in docs:
+        if not doc.page_content:
+            continue
+        sentences = [sent.text.strip() for sent in nlp(doc.page_content).sents]
+        current_chunk = ""
+        for sentence in sentences:
+            if len(current_chunk) + len(sentence) + 1 > max_chunk_chars:
+                if current_chunk:
+                    all_chunks.append(Document(page_content=current_chunk, metadata=doc.metadata))
+                current_chunk = sentence
+            else:
+                current_chunk = f"{current_chunk} {sentence}" if current_chunk else sentence
+        if current_chunk:
+            all_chunks.append(Document(page_content=current_chunk, metadata=doc.metadata))
+    return all_chunks
+
+def load_pipelines(blank: bool):
+    """Returns (legacy pipeline, current pipeline)."""
+    if blank:
+        legacy = spacy.blank("en")
+        legacy.add_pipe("sentencizer")
+        current = spacy.blank("en")
+        current.add_pipe("sentencizer")
+        return legacy, current
+    legacy = spacy.load("en_core_web_sm", disable=["ner", "parser"])
+    legacy.add_pipe("sentencizer")
+    return legacy, ingestion.load_spacy_model()
+
+def best_of(repeat: int, fn):
+    """Runs `fn` `repeat` times; returns its last result and the fastest time in seconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return result, min(timings)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf-dir", default=ingestion.PDF_SOURCE_DIR)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=ingestion.CHUNKER_BATCH_SIZE)
+    parser.add_argument("--n-process", type=int, nargs="+", default=[1])
+    parser.add_argument("--blank", action="store_true", help="Use spacy.blank('en') tokenizers when en_core_web_sm isn't installed")
+    args = parser.parse_args()
+
+    legacy_nlp, ingestion.NLP = load_pipelines(args.blank)
+    if ingestion.NLP is None:
+        sys.exit("en_core_web_sm is not installed; rerun with --blank")
+    pages = []
+    for pdf_file in sorted(os.listdir(args.pdf_dir)):
+        if pdf_file.endswith(".pdf"):
+            pages.extend(PyMuPDFLoader(os.path.join(args.pdf_dir, pdf_file)).load())
+    print(f"Corpus: {len(pages)} pages, best of {args.repeat} runs\n")
+
+    baseline, seconds = best_of(args.repeat, lambda: legacy_sentence_chunker(legacy_nlp, pages))
+    print(f"{'chunker':<36} {'chunks':>7} {'seconds':>8} {'chunks/s':>9} {'identical':>9}")
+    print(f"{'per-page nlp() (previous)':<36} {len(baseline):>7} {seconds:>8.2f} {len(baseline) / seconds:>9.1f} {'-':>9}")
+    for n_process in args.n_process:
+        chunks, seconds = best_of(args.repeat, lambda: ingestion.sentence_chunker(pages, batch_size=args.batch_size, n_process=n_process))
+        identical = [c.page_content for c in chunks] == [c.page_content for c in baseline]
+        label = f"nlp.pipe(batch={args.batch_size}, n_process={n_process})"
+        print(f"{label:<36} {len(chunks):>7} {seconds:>8.2f} {len(chunks) / seconds:>9.1f} {str(identical):>9}")
@@ -0,0 +1,69 @@
+"""
+Recall-vs-latency benchmark for the configurable FAISS index types.
+
+Builds every index type from the vectors in data/vector_store/index.faiss and
+compares it with the exact flat baseline. Queries are stored vectors with a
+small amount of noise, so no embedding API calls are needed.
+
+Usage (from the backend directory):
+    python benchmarks/index_benchmark.py --queries 200 --k 10
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import faiss
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.services.index_factory import DEFAULT_INDEX_CONFIG, INDEX_TYPES, build_index, describe_index, get_all_vectors
+
+
+def make_queries(vectors: np.ndarray, n_queries: int, noise: float, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    picked = vectors[rng.choice(len(vectors), size=min(n_queries, len(vectors)), replace=False)]
+    scale = noise * np.linalg.norm(picked, axis=1, keepdims=True) / np.sqrt(vectors.shape[1])
+    return (picked + rng.standard_normal(picked.shape).astype("float32") * scale).astype("float32")
+
+def time_queries(index, queries: np.ndarray, k: int):
+    """Searches one query at a time (like the API does) and returns labels and per-query latencies in ms."""
+    labels = np.empty((len(queries), k), dtype="int64")
+    latencies = []
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        _, labels[i] = index.search(query[None, :], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return labels, np.array(latencies)
+
+def recall_at_k(labels: np.ndarray, ground_truth: np.ndarray) -> float:
+    hits = sum(len(set(found) & set(expected)) for found, expected in zip(labels, ground_truth))
+    return hits / ground_truth.size
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index", default="data/vector_store/index.faiss")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--noise", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    vectors = get_all_vectors(faiss.read_index(args.index))
+    queries = make_queries(vectors, args.queries, args.noise, args.seed)
+    print(f"Corpus: {len(vectors)} vectors x {vectors.shape[1]} dims, {len(queries)} queries, k={args.k}\n")
+
+    baseline = build_index(vectors, dict(DEFAULT_INDEX_CONFIG, type="flat"))
+    ground_truth, _ = time_queries(baseline, queries, args.k)
+
+    print(f"{'type':<10} {'index':<42} {'build s':>8} {'recall@k':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for index_type in INDEX_TYPES:
+        start = time.perf_counter()
+        index = build_index(vectors, dict(DEFAULT_INDEX_CONFIG, type=index_type))
+        build_seconds = time.perf_counter() - start
+        labels, latencies = time_queries(index, queries, args.k)
+        print(
+            f"{index_type:<10} {describe_index(index):<42} {build_seconds:>8.2f} "
+            f"{recall_at_k(labels, ground_truth):>9.3f} "
+            f"{np.percentile(latencies, 50):>8.3f} {np.percentile(latencies, 99):>8.3f}"
+        )
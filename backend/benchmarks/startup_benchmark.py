@@ -0,0 +1,74 @@
+"""
+Cold-start benchmark for the API server.
+
+Imports app.main in fresh interpreters with `python -X importtime`, and
+reports the wall-clock import time plus a breakdown of where it goes (self
+time per top-level package, and the slowest modules by cumulative time). It
+also checks that the dependencies meant to load lazily (spaCy, the OpenAI
+SDK, LangGraph, PyMuPDF) were not imported at startup.
+
+Usage (from the backend directory):
+    python benchmarks/startup_benchmark.py --repeat 5
+    python benchmarks/startup_benchmark.py --max-seconds 2.0   # exit 1 if slower
+"""
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+from collections import defaultdict
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Only imported on first use; any of these at startup is a regression
+LAZY_MODULES = ["spacy", "openai", "langchain_openai", "langgraph", "fitz", "pymupdf", "langchain_community"]
+
+
+def measure(module: str) -> tuple[float, list[tuple[str, int, int]]]:
+    """Imports `module` in a fresh interpreter; returns (seconds, [(name, self_us, cumulative_us)])."""
+    code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "startup-benchmark")
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=BACKEND_DIR,
+                            env=env, capture_output=True, text=True, check=True)
+    seconds = float(result.stdout.strip().splitlines()[-1])
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+    return seconds, modules
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--max-seconds", type=float, help="Fail if the median import time exceeds this budget")
+    args = parser.parse_args()
+
+    runs = [measure(args.module) for _ in range(args.repeat)]
+    timings = [seconds for seconds, _ in runs]
+    median = statistics.median(timings)
+    print(f"import {args.module}: median {median:.3f}s, min {min(timings):.3f}s, max {max(timings):.3f}s ({args.repeat} cold runs)\n")
+
+    # Breakdown from the fastest run, which has the least noise
+    _, modules = min(runs, key=lambda run: run[0])
+    by_package = defaultdict(int)
+    for name, self_us, _ in modules:
+        by_package[name.split(".")[0]] += self_us
+    print(f"{'package (self time)':<40} {'ms':>8}")
+    for package, self_us in sorted(by_package.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{package:<40} {self_us / 1000:>8.1f}")
+
+    print(f"\n{'module (cumulative time)':<60} {'ms':>8}")
+    for name, _, cumulative_us in sorted(modules, key=lambda item: -item[2])[:args.top]:
+        print(f"{name:<60} {cumulative_us / 1000:>8.1f}")
+
+    imported = {name for name, _, _ in modules}
+    eager = [module for module in LAZY_MODULES if module in imported]
+    print(f"\nLazy dependencies imported at startup: {', '.join(eager) if eager else 'none'}")
+
+    if eager or (args.max_seconds is not None and median > args.max_seconds):
+        sys.exit(1)
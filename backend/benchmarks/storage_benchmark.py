@@ -0,0 +1,105 @@
+"""
+Memory and latency comparison of the index storage modes (float32, float16,
+sq8), each loaded fully into RAM and memory-mapped.
+
+Every configuration is loaded in a fresh subprocess, so load time and RSS are
+measured in isolation. RssAnon is private memory paid by every uvicorn worker;
+RssFile is page cache that memory-mapped workers share.
+
+Usage (from the backend directory):
+    python benchmarks/storage_benchmark.py --replicate 20
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+import faiss
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.services.index_factory import DEFAULT_INDEX_CONFIG, STORAGE_MODES, build_index, get_all_vectors, read_index
+
+
+def read_rss_mb() -> dict:
+    rss = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(("RssAnon", "RssFile")):
+                key, value = line.split(":")
+                rss[key] = int(value.split()[0]) / 1024
+    return rss
+
+def measure(index_path: str, queries_path: str, mmap: bool, k: int) -> dict:
+    """Runs inside the subprocess: loads the index, queries it, reports timings and RSS deltas."""
+    queries = np.load(queries_path)
+    before = read_rss_mb()
+    start = time.perf_counter()
+    index = read_index(index_path, dict(DEFAULT_INDEX_CONFIG, mmap=mmap))
+    load_ms = (time.perf_counter() - start) * 1000
+    after_load = read_rss_mb()
+    latencies = []
+    labels = []
+    for query in queries:
+        start = time.perf_counter()
+        _, found = index.search(query[None, :], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        labels.append(found[0].tolist())
+    after_queries = read_rss_mb()
+    return {
+        "load_ms": load_ms,
+        "anon_load_mb": after_load["RssAnon"] - before["RssAnon"],
+        "anon_mb": after_queries["RssAnon"] - before["RssAnon"],
+        "file_mb": after_queries["RssFile"] - before["RssFile"],
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "labels": labels,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index", default="data/vector_store/index.faiss")
+    parser.add_argument("--replicate", type=int, default=1, help="Tile the corpus N times (with noise) to simulate a larger store")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--measure", nargs=3, metavar=("INDEX", "QUERIES", "MMAP"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        index_path, queries_path, mmap = args.measure
+        print(json.dumps(measure(index_path, queries_path, mmap == "1", args.k)))
+        sys.exit(0)
+
+    rng = np.random.default_rng(0)
+    vectors = get_all_vectors(faiss.read_index(args.index))
+    if args.replicate > 1:
+        copies = [vectors] + [vectors + rng.standard_normal(vectors.shape).astype("float32") * 0.01 for _ in range(args.replicate - 1)]
+        vectors = np.vstack(copies)
+    queries = vectors[rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)]
+    print(f"Corpus: {len(vectors)} vectors x {vectors.shape[1]} dims, {len(queries)} queries, k={args.k}\n")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        queries_path = os.path.join(tmp_dir, "queries.npy")
+        np.save(queries_path, queries)
+        baseline_labels = None
+        print(f"{'storage':<8} {'mmap':<5} {'file MB':>8} {'load ms':>8} {'anon MB':>8} {'shared MB':>9} {'p50 ms':>7} {'p99 ms':>7} {'recall':>7}")
+        for storage in STORAGE_MODES:
+            index_path = os.path.join(tmp_dir, f"{storage}.faiss")
+            faiss.write_index(build_index(vectors, dict(DEFAULT_INDEX_CONFIG, storage=storage)), index_path)
+            file_mb = os.path.getsize(index_path) / 2**20
+            for mmap in (False, True):
+                output = subprocess.run(
+                    [sys.executable, __file__, "--k", str(args.k), "--measure", index_path, queries_path, "1" if mmap else "0"],
+                    capture_output=True, text=True, check=True
+                ).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                if baseline_labels is None:
+                    baseline_labels = result["labels"]
+                recall = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(result["labels"], baseline_labels)])
+                print(
+                    f"{storage:<8} {str(mmap):<5} {file_mb:>8.1f} {result['load_ms']:>8.1f} {result['anon_mb']:>8.1f} "
+                    f"{result['file_mb']:>9.1f} {result['p50_ms']:>7.3f} {result['p99_ms']:>7.3f} {recall:>7.3f}"
+                )
@@ -0,0 +1,108 @@
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+
+MAPPING_CSV = """Lifecycle,Definition,AMO,COO Ops Americas,COO Ops S&I,GOTO Operations & COO,IB Operations (BA),P&C Operations,Treasury
+Payments,Payment processing,5,40,0,0,12,0,3
+Reporting,Regulatory reporting,0,0,20,0,0,35,0
+"""
+
+
+class FakeOpenAI(ThreadingHTTPServer):
+    """
+    A local OpenAI-compatible chat completions endpoint. Records when each
+    request arrived and how many were in flight at once, answers the first
+    `rate_limited` requests with 429 + Retry-After, and rejects (400) any
+    request whose prompt contains `fail_marker`.
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeOpenAIHandler)
+        self.url = f"http://127.0.0.1:{self.server_address[1]}/v1"
+        self.delay = 0.0
+        self.rate_limited = 0
+        self.retry_after = "0.3"
+        self.fail_marker = "FAIL-THIS-DOCUMENT"
+        self.arrivals: list[float] = []
+        self.statuses: list[int] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: dict, headers: dict | None = None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        server: FakeOpenAI = self.server
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        prompt = " ".join(str(message.get("content", "")) for message in request.get("messages", []))
+        with server.lock:
+            server.arrivals.append(time.monotonic())
+            if server.rate_limited > 0:
+                server.rate_limited -= 1
+                server.statuses.append(429)
+                limited = True
+            else:
+                limited = False
+                server.in_flight += 1
+                server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        if limited:
+            error = {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}}
+            return self._send(429, error, {"Retry-After": server.retry_after})
+        try:
+            time.sleep(server.delay)
+            if server.fail_marker in prompt:
+                status = 400
+                body = {"error": {"message": "Invalid request", "type": "invalid_request_error", "code": None}}
+            else:
+                status = 200
+                if "relevant_lifecycles" in prompt:
+                    content = json.dumps({"relevant_lifecycles": ["Payments"], "author": "Fake Regulator", "regions": ["EU"]})
+                else:
+                    content = "A short summary of the document."
+                body = {
+                    "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()), "model": request.get("model"),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                    "usage": {"prompt_tokens": 10, "completion_tokens": 10, "total_tokens": 20},
+                }
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+        with server.lock:
+            server.statuses.append(status)
+        self._send(status, body)
+
+
+@pytest.fixture
+def fake_openai():
+    server = FakeOpenAI()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def backend_dir(tmp_path, monkeypatch):
+    """Runs the test from a scratch backend directory (data/ paths are relative)."""
+    (tmp_path / "data" / "vector_store").mkdir(parents=True)
+    (tmp_path / "data" / "mapping.csv").write_text(MAPPING_CSV)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    return tmp_path
@@ -0,0 +1,38 @@
+import time
+import pytest
+
+
+@pytest.fixture
+def job_queue(backend_dir, monkeypatch):
+    from app.services import ingestion_jobs
+    monkeypatch.setattr(ingestion_jobs, "JOB_BATCH_WINDOW_SECONDS", 0.05)
+    queue = ingestion_jobs.IngestionJobQueue()
+    yield ingestion_jobs, queue
+    queue.stop()
+
+def wait_until_finished(jobs, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while any(job.status not in ("completed", "failed") for job in jobs):
+        assert time.monotonic() < deadline, [job.to_dict() for job in jobs]
+        time.sleep(0.02)
+
+
+def test_job_completes_only_when_its_files_were_processed(job_queue, monkeypatch):
+    ingestion_jobs, queue = job_queue
+    # First run (scanned before b.pdf landed) only knows a.pdf; the next run has both
+    runs = iter([["a.pdf"], ["a.pdf", "b.pdf"]])
+    monkeypatch.setattr(ingestion_jobs, "process_pdfs_incrementally", lambda progress=None: next(runs))
+    a, b = queue.submit(["a.pdf"]), queue.submit(["b.pdf"])
+    wait_until_finished([a, b])
+    assert (a.status, a.runs) == ("completed", 1)
+    assert (b.status, b.runs) == ("completed", 2)
+
+
+def test_job_fails_when_its_file_is_never_processed(job_queue, monkeypatch):
+    ingestion_jobs, queue = job_queue
+    monkeypatch.setattr(ingestion_jobs, "process_pdfs_incrementally", lambda progress=None: ["a.pdf"])
+    job = queue.submit(["missing.pdf"])
+    wait_until_finished([job])
+    assert job.status == "failed"
+    assert job.runs == ingestion_jobs.JOB_MAX_RUNS
+    assert "missing.pdf" in job.error
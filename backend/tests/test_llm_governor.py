@@ -0,0 +1,107 @@
+import time
+import asyncio
+import pytest
+import openai
+from app.services.llm_governor import RateLimitGovernor, BackgroundEventLoop
+
+
+def chat_client(server):
+    # The SDK's own retries are off, so every retry is the governor's
+    return openai.AsyncOpenAI(base_url=server.url, api_key="test", max_retries=0)
+
+def completion(client, text: str = "hello"):
+    return lambda: client.chat.completions.create(model="gpt-4o-mini", messages=[{"role": "user", "content": text}])
+
+
+def test_concurrency_cap(fake_openai):
+    fake_openai.delay = 0.2
+    governor = RateLimitGovernor(requests_per_minute=1000, tokens_per_minute=10**6, max_concurrency=3)
+
+    async def main():
+        client = chat_client(fake_openai)
+        return await asyncio.gather(*(governor.run(completion(client), tokens=10) for _ in range(10)))
+
+    results = asyncio.run(main())
+    assert len(results) == 10
+    assert fake_openai.max_in_flight == 3
+    assert governor.requests == 10
+
+
+def test_requests_per_window_throttling(fake_openai):
+    governor = RateLimitGovernor(requests_per_minute=3, tokens_per_minute=10**6, max_concurrency=10, window_seconds=1.0)
+
+    async def main():
+        client = chat_client(fake_openai)
+        await asyncio.gather(*(governor.run(completion(client), tokens=10) for _ in range(6)))
+
+    asyncio.run(main())
+    arrivals = sorted(fake_openai.arrivals)
+    assert len(arrivals) == 6
+    # Any 3 consecutive requests fit in a window; the 4th had to wait for the first to leave it
+    assert arrivals[2] - arrivals[0] < 0.5
+    assert arrivals[3] - arrivals[0] >= 0.95
+
+
+def test_tokens_per_window_throttling(fake_openai):
+    governor = RateLimitGovernor(requests_per_minute=1000, tokens_per_minute=100, max_concurrency=10, window_seconds=1.0)
+
+    async def main():
+        client = chat_client(fake_openai)
+        await asyncio.gather(*(governor.run(completion(client), tokens=40) for _ in range(4)))
+
+    asyncio.run(main())
+    arrivals = sorted(fake_openai.arrivals)
+    # Two 40-token requests fit the 100-token budget, a third does not
+    assert arrivals[1] - arrivals[0] < 0.5
+    assert arrivals[2] - arrivals[0] >= 0.95
+
+
+def test_retries_rate_limits_after_retry_after(fake_openai):
+    fake_openai.rate_limited = 2
+    fake_openai.retry_after = "0.3"
+    # Without Retry-After the backoff would be 30s or more
+    governor = RateLimitGovernor(requests_per_minute=1000, tokens_per_minute=10**6, max_concurrency=1, base_delay=30.0)
+
+    async def main():
+        return await governor.run(completion(chat_client(fake_openai)), tokens=10)
+
+    start = time.monotonic()
+    response = asyncio.run(main())
+    assert response.choices[0].message.content
+    assert fake_openai.statuses == [429, 429, 200]
+    assert governor.retries == 2
+    gaps = [later - earlier for earlier, later in zip(fake_openai.arrivals, fake_openai.arrivals[1:])]
+    assert all(gap >= 0.3 for gap in gaps)
+    assert time.monotonic() - start < 5
+
+
+def test_retries_give_up_after_max_retries(fake_openai):
+    fake_openai.rate_limited = 10
+    fake_openai.retry_after = "0.05"
+    governor = RateLimitGovernor(requests_per_minute=1000, tokens_per_minute=10**6, max_concurrency=1, max_retries=2)
+
+    with pytest.raises(openai.RateLimitError):
+        asyncio.run(governor.run(completion(chat_client(fake_openai)), tokens=10))
+    assert fake_openai.statuses == [429, 429, 429]
+
+
+def test_failed_document_does_not_stop_the_batch(fake_openai, backend_dir, monkeypatch):
+    from langchain_openai import ChatOpenAI
+    from app.services import ingestion
+    monkeypatch.setattr(ingestion, "get_llm", lambda: ChatOpenAI(model="gpt-4o-mini", base_url=fake_openai.url, api_key="test", max_retries=0))
+    fake_openai.delay = 0.05
+    loop = BackgroundEventLoop()
+    documents = {f"doc{i}.pdf": f"Regulatory text of document {i}." for i in range(6)}
+    documents["doc3.pdf"] = f"Regulatory text {fake_openai.fail_marker}."
+    monkeypatch.setattr(ingestion, "LLM_GOVERNOR", RateLimitGovernor(requests_per_minute=1000, tokens_per_minute=10**6, max_concurrency=4))
+    # Submitted the way ingestion submits its analyses: one future per document on the shared loop
+    futures = {name: loop.submit(ingestion.analyze_document_for_heatmap_async(text, name)) for name, text in documents.items()}
+
+    with pytest.raises(openai.BadRequestError):
+        futures.pop("doc3.pdf").result(timeout=30)
+    for name, future in futures.items():
+        metadata = future.result(timeout=30)
+        assert metadata["author"] == "Fake Regulator"
+        assert metadata["impactedLifecycles"] == ["Payments"]
+        assert metadata["heatmapData"]["COO Ops Americas"]["level"] == "High"
+        assert "Americas" in metadata["regions"]
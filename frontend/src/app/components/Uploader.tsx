@@ -46,6 +46,20 @@ export const Uploader = () => {
                 throw new Error(data.detail || 'Upload failed.');
             }
 
+            // Ingestion runs in the background; poll the job until it finishes
+            let job: { status: string; error?: string | null; detail?: string } = { status: 'queued' };
+            while (job.status === 'queued' || job.status === 'running') {
+                await new Promise((resolve) => setTimeout(resolve, 1000));
+                const jobRes = await fetch(`${process.env.NEXT_PUBLIC_API_BASE_URL}/api/jobs/${data.job_id}`);
+                job = await jobRes.json();
+                if (!jobRes.ok) {
+                    throw new Error(job.detail || 'Could not read the ingestion status.');
+                }
+            }
+            if (job.status === 'failed') {
+                throw new Error(job.error || 'Ingestion failed.');
+            }
+
             setStatus('success');
             setMessage(`Successfully uploaded and processed ${data.filename}. It's now available for analysis.`);
         } catch (error) {